@@ -0,0 +1,152 @@
+from queue import Empty, SimpleQueue
+from threading import Event, Lock, Thread
+import config
+
+# Mailbox items processed per wakeup at most
+BATCH_SIZE = 64
+
+
+class Reply(object):
+    """
+    Result of a command run by an actor, waited for by another thread.
+
+    Attributes:
+        value (object): Result of the command, once it is set.
+    """
+    def __init__(self):
+        """
+        Constructor for class Reply.
+        """
+        self.value = None
+        self.__event = Event()
+
+    def set(self, value):
+        """
+        Sets the result and wakes up the waiting thread.
+
+        Args:
+            value (object): Result of the command.
+        """
+        self.value = value
+        self.__event.set()
+
+    def is_set(self):
+        """
+        Returns:
+            bool: True if the result is set; False otherwise.
+        """
+        return self.__event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Waits until the result is set.
+
+        Args:
+            timeout (float, optional): Seconds to wait at most. Defaults to
+                None, to wait as long as needed.
+
+        Returns:
+            bool: True if the result is set; False if the time ran out.
+        """
+        return self.__event.wait(timeout)
+
+
+class Actor(Thread):
+    """
+    Thread that owns the protocol state of one or more nodes. The messages
+    they receive and the commands of their local threads are posted to its
+    mailbox and run one at a time, in order of arrival, so the handlers
+    need no locks and the Lamport clocks are only touched from here. Every
+    wakeup drains the mailbox in batches of up to BATCH_SIZE items.
+
+    Attributes:
+        daemon (bool): Thread's daemon option.
+        mailbox (SimpleQueue): Pending (function, args) calls.
+    """
+    def __init__(self):
+        """
+        Constructor for class Actor.
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.mailbox = SimpleQueue()
+
+    def post(self, function, *args):
+        """
+        Queues a call to be run by the actor.
+
+        Args:
+            function (callable): Function to be called.
+            *args: Arguments of the call.
+        """
+        self.mailbox.put((function, args))
+
+    def sync(self):
+        """
+        Waits until the calls already posted have run.
+        """
+        reply = Reply()
+        self.post(reply.set, True)
+        reply.wait()
+
+    def run(self):
+        """
+        Worker for the objects of this class launched as Threads.
+        """
+        batch = []
+        while True:
+            batch.append(self.mailbox.get())
+            try:
+                while len(batch) < BATCH_SIZE:
+                    batch.append(self.mailbox.get_nowait())
+            except Empty:
+                None
+
+            for item in batch:
+                if item is None:
+                    return
+
+                function, args = item
+                try:
+                    function(*args)
+                except Exception as e:
+                    print("Exception: ", end="")
+                    print(e)
+            batch.clear()
+
+    def stop(self):
+        """
+        Stops the actor once the calls already posted have run.
+        """
+        self.mailbox.put(None)
+
+
+_actors = []
+_actors_lock = Lock()
+
+
+def get_actor(node_id):
+    """
+    Returns the actor in charge of a node. With config.actor_threads set,
+    nodes are spread over that many actors, started the first time;
+    otherwise each node gets its own.
+
+    Args:
+        node_id (int): Id of the node.
+
+    Returns:
+        Actor: Actor for the node.
+    """
+    if not config.actor_threads:
+        actor = Actor()
+        actor.start()
+        return actor
+
+    with _actors_lock:
+        if not _actors:
+            for i in range(config.actor_threads):
+                actor = Actor()
+                actor.start()
+                _actors.append(actor)
+
+    return _actors[node_id % len(_actors)]
@@ -0,0 +1,365 @@
+import asyncio
+import os
+from protocol import MaekawaProtocol, flog, clog
+from recvBuffer import RecvBuffer
+from transport import UnixTransport
+import codec
+import config
+import logger_config
+import quorum
+import utils
+
+# Values of config.transport the asyncio runtime can run on
+ASYNC_TRANSPORTS = ("tcp", "unix")
+
+
+class AsyncNodeSend(object):
+    """
+    Handles an asynchronous node's operations related to message sending.
+    Writes are buffered by the asyncio streams and never block the event
+    loop.
+
+    Attributes:
+        node (AsyncNode): Node that sends the messages.
+        writers (dict): Stream writer to each connected node, by id.
+        pending (dict): Messages to nodes still being connected, by id.
+        codec (JsonCodec | BinaryCodec): Wire format for the messages.
+    """
+    def __init__(self, node):
+        """
+        Constructor for class AsyncNodeSend.
+
+        Args:
+            node (AsyncNode): Node that sends the messages.
+        """
+        self.node = node
+        self.writers = {}
+        self.pending = {}
+        self.codec = codec.get_codec()
+        self.__connecting = set()
+
+    async def build_connection(self):
+        """
+        Connects to the server of each member of the node's quorum and of
+        each node whose requests it arbitrates. Connections to any other
+        node are opened on demand.
+        """
+        for i in set(self.node.collegues) | set(self.node.quorum_map.arbiter_of(self.node.id)):
+            if i not in self.writers and i not in self.pending:
+                _, self.writers[i] = await self.__open(i)
+
+    async def __open(self, dest):
+        """
+        Opens a stream to a node over the node's transport.
+
+        Args:
+            dest (int): Destination Node id.
+
+        Returns:
+            tuple: Reader and writer of the stream.
+        """
+        if self.node.transport == "unix":
+            return await asyncio.open_unix_connection(UnixTransport.socket_path(dest))
+        return await asyncio.open_connection(*utils.node_address(dest))
+
+    async def __connect(self, dest):
+        """
+        Connects to a node and flushes the messages sent to it meanwhile.
+        If the node cannot be reached, those messages are dropped.
+
+        Args:
+            dest (int): Destination Node id.
+        """
+        try:
+            _, writer = await self.__open(dest)
+        except OSError as e:
+            # Drop what was sent meanwhile; the next message tries again
+            print("Exception: ", end="")
+            print(e)
+            del self.pending[dest]
+            return
+
+        writer.writelines(self.pending.pop(dest))
+        self.writers[dest] = writer
+
+    def send_message(self, msg, dest, multicast=False):
+        """
+        Sends a message to a single destination.
+
+        Args:
+            msg (Message): Message to be sent.
+            dest (int): Destination Node id.
+            multicast (bool, optional): True for multicast option; False for single destination. Defaults to False.
+        """
+        if not multicast:
+            self.node.lamport_ts += 1
+            msg.set_ts(self.node.lamport_ts)
+        assert dest == msg.dest
+
+        self.__write(dest, (self.codec.encode(msg),))
+        self.node.metrics.message_sent(msg.msg_type)
+
+    def __write(self, dest, parts):
+        """
+        Writes an encoded message to a node, connecting to it if needed.
+
+        Args:
+            dest (int): Destination Node id.
+            parts (tuple): Buffers that form the encoded message.
+        """
+        if dest in self.writers:
+            self.writers[dest].writelines(parts)
+        elif dest in self.pending:
+            self.pending[dest].extend(parts)
+        else:
+            self.pending[dest] = list(parts)
+            task = asyncio.get_running_loop().create_task(self.__connect(dest))
+            self.__connecting.add(task)
+            task.add_done_callback(self.__connecting.discard)
+
+    def multicast(self, msg, group):
+        """
+        Sends a message to all Nodes within a group. The message is encoded
+        once for the whole group; only its destination is encoded for each
+        Node.
+
+        Args:
+            msg (Message): Message to be sent.
+            group (list): IDs of all the nodes in the group.
+        """
+        self.node.lamport_ts += 1
+        msg.set_ts(self.node.lamport_ts)
+        head, tail = self.codec.encode_template(msg)
+        for dest in group:
+            self.__write(dest, (head, self.codec.encode_dest(dest), tail))
+        self.node.metrics.message_sent(msg.msg_type, len(group))
+
+    async def drain(self):
+        """
+        Waits until the buffered writes to all nodes have been flushed.
+        """
+        for writer in self.writers.values():
+            await writer.drain()
+
+    async def close(self):
+        """
+        Closes the connections to all nodes.
+        """
+        for writer in self.writers.values():
+            writer.close()
+            await writer.wait_closed()
+
+
+class AsyncNode(MaekawaProtocol):
+    """
+    Node of the distributed system that runs Maekawa's algorithm on an
+    asyncio event loop, so it can be embedded in asynchronous applications.
+    The critical section is entered with:
+
+        async with node:
+            ...
+
+    Attributes:
+        id (int): Numerical identifier of the Node.
+        port (int): Node's port.
+        transport (str): Stream transport of config.transport, "tcp" or
+            "unix".
+        client (AsyncNodeSend): Client for handling message sending.
+        server (asyncio.Server): Server for the incoming connections.
+    """
+    def __init__(self, id, quorum_map):
+        """
+        Constructor for class AsyncNode.
+
+        Args:
+            id (int): Numerical identifier of the Node.
+            quorum_map (QuorumMap): Quora of all the nodes. Shared by all
+                nodes.
+
+        Raises:
+            ValueError: If config.transport is not a stream transport.
+        """
+        if config.transport not in ASYNC_TRANSPORTS:
+            raise ValueError(f"[ValueError]: Transport {config.transport} is not supported by AsyncNode")
+
+        self.id = id
+        self.transport = config.transport
+        self.port = utils.node_address(id)[1]
+        self._init_protocol(quorum_map, config.grant_forwarding, config.sticky_grants)
+        self.client = AsyncNodeSend(self)
+        self.server = None
+
+        # Local lock, grant event and coroutines using them, of each key
+        self._locals = {}
+
+    async def listen(self):
+        """
+        Starts accepting connections from other nodes.
+        """
+        if self.transport == "unix":
+            self.server = await asyncio.start_unix_server(self.__serve, UnixTransport.socket_path(self.id))
+        else:
+            self.server = await asyncio.start_server(self.__serve, *utils.node_address(self.id))
+
+    async def do_connections(self):
+        """
+        Connect to the members of the quorum. All of them must be listening.
+        """
+        await self.client.build_connection()
+
+    async def __serve(self, reader, writer):
+        """
+        Receives the messages of a connection and processes them, until it
+        is closed or its stream turns out malformed.
+
+        Args:
+            reader (asyncio.StreamReader): Reading end of the connection.
+            writer (asyncio.StreamWriter): Writing end of the connection.
+        """
+        buffer = RecvBuffer(self.client.codec)
+
+        while True:
+            try:
+                data = await reader.read(4096)
+                if not data:
+                    break
+
+                buffer.feed(data)
+                msgs = buffer.messages()
+            except (OSError, ValueError) as e:
+                print("Exception: ", end="")
+                print(e)
+                break
+
+            for m in msgs:
+                clog.info("Node_%i receive msg: %s", self.id, m)
+                flog.info("Node_%i receive msg: %s", self.id, m)
+                try:
+                    self.handle(m)
+                except Exception as e:
+                    print("Exception: ", end="")
+                    print(e)
+
+        writer.close()
+
+    def _all_granted(self, state):
+        """
+        Wakes up the coroutine waiting to enter the CS.
+
+        Args:
+            state (LockState): State of the granted lock.
+        """
+        self._locals[state.key][1].set()
+
+    def __leave(self, key):
+        """
+        Counts a coroutine done with a lock, dropping the lock's local
+        state once none is using it.
+
+        Args:
+            key (str): Name of the lock.
+        """
+        self._locals[key][2] -= 1
+        if not self._locals[key][2]:
+            del self._locals[key]
+
+    async def acquire(self, key=None, shared=False):
+        """
+        Waits until the node has entered the critical section. Coroutines
+        of the same node enter one at a time. If the coroutine is cancelled
+        while waiting, e.g. by asyncio.wait_for, the request is given up.
+
+        Args:
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+            shared (bool, optional): True to share the section with other
+                shared requests; False for exclusive access. Defaults to
+                False.
+        """
+        if key not in self._locals:
+            self._locals[key] = [asyncio.Lock(), asyncio.Event(), 0]
+        local, granted, _ = self._locals[key]
+        self._locals[key][2] += 1
+
+        state = None
+        locked = False
+        try:
+            await local.acquire()
+            locked = True
+            granted.clear()
+            state = self.request_cs(key=key, shared=shared)
+            await self.client.drain()
+
+            # Wait for unanimous grant
+            while len(state.grants_received) < len(self.collegues):
+                await granted.wait()
+                granted.clear()
+        except BaseException:
+            # Cancelled, e.g. by a timeout: withdraw the request, so the
+            # arbiters neither keep it queued nor the GRANTs given to it
+            try:
+                if state is not None:
+                    self.cancel_cs(key)
+                    await self.client.drain()
+            finally:
+                if locked:
+                    local.release()
+                self.__leave(key)
+            raise
+
+        self._enter_cs(state)
+
+    async def release(self, key=None):
+        """
+        Leaves the critical section.
+
+        Args:
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+        """
+        self.release_cs(key)
+        self._locals[key][0].release()
+        self.__leave(key)
+        await self.client.drain()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    async def close(self):
+        """
+        Stops the server and closes the connections to all nodes.
+        """
+        self.server.close()
+        await self.client.close()
+        await self.server.wait_closed()
+        if self.transport == "unix":
+            try:
+                os.unlink(UnixTransport.socket_path(self.id))
+            except FileNotFoundError:
+                None
+
+
+async def start_nodes(ids):
+    """
+    Creates the nodes with the given ids and connects them once all of them
+    are listening.
+
+    Args:
+        ids (list): Ids of the nodes to run on this event loop.
+
+    Returns:
+        list: The connected AsyncNodes.
+    """
+    if config.log_mode == "async":
+        logger_config.enable_async_logging()
+    quorum_map = quorum.get_quorum_map(config.numNodes)
+    nodes = [AsyncNode(i, quorum_map) for i in ids]
+    for node in nodes:
+        await node.listen()
+    for node in nodes:
+        await node.do_connections()
+    return nodes
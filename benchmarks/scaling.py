@@ -0,0 +1,160 @@
+"""
+Scaling benchmark of the mutex. Runs the system for increasing numbers of
+nodes under a seeded workload, the same for every transport and quorum
+strategy, and reports, for each size, the critical section throughput, the
+synchronization delay, the messages sent per entry and the acquire latency.
+By default the workload saturates the system: every node requests the
+section again as soon as it releases it, so the throughput is the highest
+the system sustains. The open-loop workloads measure the latency at a given
+offered load instead, which their throughput merely follows.
+Run it from the repository root:
+
+    python -m benchmarks.scaling --sizes 4 9 16 --output results.json
+"""
+import argparse
+import json
+import platform
+import time
+import config
+import metrics
+import protocol
+from maekawaMutex import MaekawaMutex
+
+# Perfect squares from 4 to 1024, so that the grids are complete
+DEFAULT_SIZES = [k * k for k in range(2, 33)]
+
+# Workloads of the benchmark; "saturate" runs closed-loop rounds with no wait
+WORKLOADS = ("saturate", "rounds", "poisson", "onoff", "trace")
+
+
+def run_once(n):
+    """
+    Runs the system with n nodes until every node has served its requests.
+
+    Args:
+        n (int): Number of nodes.
+
+    Returns:
+        dict: Results of the run.
+    """
+    config.numNodes = n
+    mutex = MaekawaMutex()
+
+    start = time.monotonic()
+    mutex.run()
+    elapsed = time.monotonic() - start
+
+    snapshots = mutex.snapshot()
+    mutex.close()
+
+    return metrics.summarize(snapshots, elapsed)
+
+
+def fmt(value, spec, scale=1):
+    """
+    Formats a result that may be missing, e.g. the latencies of a size
+    that got no entries.
+
+    Args:
+        value (float): Result, or None.
+        spec (str): Format specification of the number.
+        scale (float, optional): Factor applied to the number. Defaults to 1.
+
+    Returns:
+        str: The formatted number, or a dash as wide as it.
+    """
+    if value is None:
+        return format("-", ">" + spec.split(".")[0])
+    return format(value * scale, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark of Maekawa's mutex.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="numbers of nodes to run (default: squares from 4 to 1024)")
+    parser.add_argument("--rounds", type=int, default=10,
+                        help="critical section entries per node of the saturate and rounds workloads")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the workload")
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="factor applied to the nodes' random waits")
+    parser.add_argument("--workload", default="saturate", choices=WORKLOADS,
+                        help="arrival process (default: saturate, closed loop with no wait between "
+                             "requests); rounds waits at random, scaled by --time-scale, so it mostly "
+                             "measures those waits; the rest offer --rate requests per second")
+    parser.add_argument("--rate", type=float, default=config.arrival_rate,
+                        help="requests per second of the whole system")
+    parser.add_argument("--duration", type=float, default=config.duration, help="seconds of requests to generate")
+    parser.add_argument("--hold", default=config.hold_time, help="distribution of the hold time")
+    parser.add_argument("--hotspots", type=int, default=config.hotspots, help="nodes that request more often")
+    parser.add_argument("--trace-file", default=config.trace_file, help="requests to replay with the trace workload")
+    parser.add_argument("--read-ratio", type=float, default=config.read_ratio,
+                        help="share of the workload's requests that take the lock shared")
+    parser.add_argument("--transport", default="inmemory", help="transport to use")
+    parser.add_argument("--codec", default=config.codec, help="codec for the TCP transport")
+    parser.add_argument("--quorum", default=config.quorum, help="quorum strategy")
+    parser.add_argument("--forwarding", action="store_true", default=config.grant_forwarding,
+                        help="forward GRANTs on release")
+    parser.add_argument("--sticky", action="store_true", default=config.sticky_grants,
+                        help="keep GRANTs after release until recalled")
+    parser.add_argument("--reactor-threads", type=int, default=4,
+                        help="event loops shared by the nodes' sockets")
+    parser.add_argument("--actor-threads", type=int, default=4,
+                        help="threads that run the protocol of the nodes")
+    parser.add_argument("--output", default="benchmark_results.json", help="file for the JSON results")
+    args = parser.parse_args()
+
+    config.rounds = args.rounds
+    config.seed = args.seed
+    config.time_scale = args.time_scale
+    config.workload = args.workload
+    if args.workload == "saturate":
+        config.workload = "rounds"
+        config.time_scale = 0
+    config.arrival_rate = args.rate
+    config.duration = args.duration
+    config.hold_time = args.hold
+    config.hotspots = args.hotspots
+    config.trace_file = args.trace_file
+    config.read_ratio = args.read_ratio
+    config.transport = args.transport
+    config.codec = args.codec
+    config.quorum = args.quorum
+    config.grant_forwarding = args.forwarding
+    config.sticky_grants = args.sticky
+    config.reactor_threads = args.reactor_threads
+    config.actor_threads = args.actor_threads
+
+    # Logging every message would dominate the measurements
+    protocol.flog.setLevel(protocol.logger_config.logging.WARNING)
+    protocol.clog.setLevel(protocol.logger_config.logging.WARNING)
+
+    if args.workload == "saturate":
+        print(f"workload=saturate rounds={args.rounds}: closed loop, "
+              "throughput is the highest sustained", flush=True)
+    elif args.workload == "rounds":
+        print(f"workload=rounds rounds={args.rounds} time_scale={args.time_scale}: "
+              "throughput is bound by the nodes' random waits", flush=True)
+    else:
+        print(f"workload={args.workload} rate={args.rate}/s duration={args.duration}s hold={args.hold}", flush=True)
+
+    results = []
+    for n in args.sizes:
+        result = run_once(n)
+        results.append(result)
+        print(f"N={n:5d}  {fmt(result['entries_per_sec'], '9.1f')} entries/s  "
+              f"{fmt(result['messages_per_entry'], '7.1f')} msgs/entry  "
+              f"acquire p50={fmt(result['acquire_p50'], '8.2f', 1000)}ms "
+              f"p99={fmt(result['acquire_p99'], '8.2f', 1000)}ms  "
+              f"sync delay={fmt(result['sync_delay_p50'], '7.2f', 1000)}ms", flush=True)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "parameters": vars(args),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Runs the system over several worker processes, so that the nodes are not
+bound to a single interpreter and its GIL. Each worker runs a shard of the
+nodes over the configured transport; they wait for each other to be
+listening and connected before starting, and for every node of the system
+to be done before shutting down. The metrics of all the workers are then summarized:
+
+    python cluster.py --nodes 64 --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+from queue import Empty
+import time
+import config
+import metrics
+from maekawaMutex import MaekawaMutex
+
+
+def shards(n, workers):
+    """
+    Spreads the nodes over the workers, round robin.
+
+    Args:
+        n (int): Number of nodes.
+        workers (int): Number of worker processes.
+
+    Returns:
+        list: Ids of the nodes of each worker.
+    """
+    return [list(range(k, n, workers)) for k in range(workers)]
+
+
+def worker(index, node_ids, settings, ready, finish, results):
+    """
+    Worker process. Runs its shard of the nodes and reports their metrics.
+
+    Args:
+        index (int): Index of the worker.
+        node_ids (list): Ids of the nodes to run.
+        settings (dict): Values of config in the launcher.
+        ready (Barrier): Barrier of all the workers.
+        finish (Barrier): Barrier of all the nodes of the system.
+        results (Queue): Gets (index, snapshots) once the system is done.
+    """
+    vars(config).update(settings)
+    if config.metrics_port is not None:
+        config.metrics_port += index
+
+    mutex = MaekawaMutex(node_ids, finish)
+
+    # Every server is listening before any node connects, and every node
+    # is connected before any starts
+    ready.wait()
+    mutex.define_connections()
+    ready.wait()
+
+    mutex.run()
+    results.put((index, mutex.snapshot()))
+    mutex.close()
+
+
+def run_cluster(workers=None):
+    """
+    Runs the system with config.numNodes nodes over worker processes and
+    waits for all of them.
+
+    Args:
+        workers (int, optional): Number of worker processes, at most one
+            per node. Defaults to None, for one per CPU.
+
+    Raises:
+        ValueError: If the transport does not reach other processes.
+        RuntimeError: If some worker fails.
+
+    Returns:
+        dict: Results of the run, as metrics.summarize returns.
+    """
+    if config.transport == "inmemory":
+        raise ValueError(f"[ValueError]: Transport {config.transport} does not reach other processes")
+
+    n = config.numNodes
+    workers = min(workers or os.cpu_count(), n)
+    settings = {k: v for k, v in vars(config).items() if not k.startswith("__")}
+
+    ready = multiprocessing.Barrier(workers)
+    finish = multiprocessing.Barrier(n)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(k, node_ids, settings, ready, finish, results))
+                 for k, node_ids in enumerate(shards(n, workers))]
+
+    start = time.monotonic()
+    for process in processes:
+        process.start()
+
+    # Stop the rest if a worker dies, since its nodes would never finish
+    snapshots = []
+    pending = len(processes)
+    while pending:
+        try:
+            snapshots.extend(results.get(timeout=1)[1])
+            pending -= 1
+        except Empty:
+            failed = [process for process in processes if process.exitcode not in (None, 0)]
+            if failed:
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError(f"[RuntimeError]: Worker {failed[0].name} exited with code {failed[0].exitcode}")
+    elapsed = time.monotonic() - start
+
+    for process in processes:
+        process.join()
+
+    return metrics.summarize(snapshots, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs Maekawa's mutex over several processes.")
+    parser.add_argument("--nodes", type=int, default=config.numNodes, help="number of nodes")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, at most one per node (default: one per CPU)")
+    args = parser.parse_args()
+
+    config.numNodes = args.nodes
+    result = run_cluster(args.workers)
+    print(f"{result['entries_per_sec']:.1f} entries/s  "
+          f"{result['messages_per_entry']:.1f} msgs/entry  "
+          f"acquire p50={result['acquire_p50'] * 1000:.2f}ms p99={result['acquire_p99'] * 1000:.2f}ms")
+    print("Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import json
+import struct
+import config
+from message import Message, Message_type
+
+# Bytes a JSON frame takes at most
+MAX_JSON_FRAME = 1 << 20
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+class JsonCodec(object):
+    """
+    Codec that exchanges Messages as back-to-back serialized JSONs, as
+    produced by Message.to_json.
+
+    Attributes:
+        name (str): Name under which the codec is selected in config.
+    """
+    name = "json"
+
+    def encode(self, msg):
+        """
+        Serializes a Message.
+
+        Args:
+            msg (Message): Message to be serialized.
+
+        Returns:
+            bytes: Serialized JSON of the message.
+        """
+        return msg.to_json().encode("utf-8")
+
+    def encode_template(self, msg):
+        """
+        Serializes a Message for several destinations at once. The
+        serialized message for a destination is head + encode_dest(dest) +
+        tail.
+
+        Args:
+            msg (Message): Message to be serialized, whatever its dest.
+
+        Returns:
+            tuple: Bytes before and after the destination.
+        """
+        head = '{"msg_type": %i, "src": %s, "dest": ' % (msg.msg_type.value, json.dumps(msg.src))
+        tail = ', "ts": %s, "data": %s' % (json.dumps(msg.ts), json.dumps(msg.data))
+        if msg.key is not None:
+            tail += ', "key": %s' % json.dumps(msg.key)
+        tail += '}'
+
+        return head.encode("utf-8"), tail.encode("utf-8")
+
+    def encode_dest(self, dest):
+        """
+        Serializes the destination of a Message.
+
+        Args:
+            dest (int): Destination Node id.
+
+        Returns:
+            bytes: Serialized destination.
+        """
+        return b"%i" % dest
+
+    def decode(self, buf):
+        """
+        Extracts all the complete Messages at the start of a byte stream.
+
+        Args:
+            buf (bytes-like): Stream with one or more back-to-back JSONs.
+
+        Raises:
+            ValueError: If the stream is malformed.
+
+        Returns:
+            tuple: List of decoded Messages and number of bytes consumed.
+        """
+        # Message.to_json escapes non-ASCII characters, so every character
+        # of the stream is exactly one byte.
+        stream = bytes(buf).decode("ascii")
+        msgs = []
+        start = 0
+
+        while start < len(stream):
+            if stream[start] != "{":
+                raise ValueError(f"[ValueError]: Malformed JSON frame at byte {start}")
+
+            # JSONs delimit themselves, whatever their keys contain
+            try:
+                obj, end = _JSON_DECODER.raw_decode(stream, start)
+            except ValueError:
+                # Only the last JSON of the stream can be truncated; a
+                # malformed one is told apart once it outgrows any frame
+                if len(stream) - start > MAX_JSON_FRAME:
+                    raise
+                break
+
+            # A JSON that is not a Message is as malformed as a broken one
+            try:
+                msgs.append(Message.from_json(obj))
+            except (KeyError, TypeError) as e:
+                raise ValueError(f"[ValueError]: Malformed JSON frame at byte {start}: {e!r}") from e
+            start = end
+
+        return msgs, start
+
+
+class BinaryCodec(object):
+    """
+    Codec that exchanges Messages as fixed-layout binary frames:
+
+        | length (u32) | version (u8) | type (u8) | src (i32) | dest (i32) |
+        | ts (i64) | key length (u16) | key (UTF-8) |
+        | payload (JSON of data, absent if data is None) |
+
+    All fields are in network byte order and the length prefix counts the
+    bytes that follow it. None values for src, dest and ts are sent as -1,
+    and a None key as 0xFFFF. Frames of version 1, which have no key
+    fields, are still decoded.
+
+    Attributes:
+        name (str): Name under which the codec is selected in config.
+        VERSION (int): Version of the frame layout.
+    """
+    name = "binary"
+    VERSION = 2
+
+    _PREFIX = struct.Struct("!I")
+    _HEADER_V1 = struct.Struct("!IBBiiq")
+    _HEADER = struct.Struct("!IBBiiqH")
+    _HEAD = struct.Struct("!IBBi")
+    _DEST = struct.Struct("!i")
+    _TAIL = struct.Struct("!qH")
+    _NO_KEY = 0xFFFF
+
+    def encode(self, msg):
+        """
+        Packs a Message into a frame.
+
+        Args:
+            msg (Message): Message to be packed.
+
+        Returns:
+            bytes: Frame with the message.
+        """
+        payload = b"" if msg.data is None else json.dumps(msg.data).encode("utf-8")
+        key = self.__encode_key(msg.key)
+        header = self._HEADER.pack(
+            self._HEADER.size - self._PREFIX.size + len(key) + len(payload),
+            self.VERSION,
+            msg.msg_type.value,
+            _none_to_int(msg.src),
+            _none_to_int(msg.dest),
+            _none_to_int(msg.ts),
+            self._NO_KEY if msg.key is None else len(key)
+        )
+        return header + key + payload
+
+    def encode_template(self, msg):
+        """
+        Packs a Message for several destinations at once. The frame for a
+        destination is head + encode_dest(dest) + tail.
+
+        Args:
+            msg (Message): Message to be packed, whatever its dest.
+
+        Returns:
+            tuple: Bytes before and after the destination.
+        """
+        payload = b"" if msg.data is None else json.dumps(msg.data).encode("utf-8")
+        key = self.__encode_key(msg.key)
+        head = self._HEAD.pack(
+            self._HEADER.size - self._PREFIX.size + len(key) + len(payload),
+            self.VERSION,
+            msg.msg_type.value,
+            _none_to_int(msg.src)
+        )
+        tail = self._TAIL.pack(
+            _none_to_int(msg.ts),
+            self._NO_KEY if msg.key is None else len(key)
+        )
+        return head, tail + key + payload
+
+    def __encode_key(self, key):
+        """
+        Encodes the key of a Message.
+
+        Raises:
+            ValueError: If the key is too long for the frame.
+
+        Returns:
+            bytes: UTF-8 of the key, empty if it is None.
+        """
+        if key is None:
+            return b""
+        key = key.encode("utf-8")
+        if len(key) >= self._NO_KEY:
+            raise ValueError(f"[ValueError]: Lock key too long: {len(key)} bytes")
+        return key
+
+    def encode_dest(self, dest):
+        """
+        Packs the destination of a Message.
+
+        Args:
+            dest (int): Destination Node id.
+
+        Returns:
+            bytes: Packed destination.
+        """
+        return self._DEST.pack(dest)
+
+    def decode(self, buf):
+        """
+        Extracts all the complete frames at the start of a byte stream.
+
+        Args:
+            buf (bytes-like): Stream with one or more back-to-back frames.
+
+        Raises:
+            ValueError: If a frame has an unsupported version.
+
+        Returns:
+            tuple: List of decoded Messages and number of bytes consumed.
+        """
+        msgs = []
+        start = 0
+        size = len(buf)
+
+        while size - start >= self._HEADER_V1.size:
+            length, version, msg_type, src, dest, ts = self._HEADER_V1.unpack_from(buf, start)
+            end = start + self._PREFIX.size + length
+
+            # The rest of the frame has not arrived yet
+            if end > size:
+                break
+
+            key = None
+            if version == self.VERSION:
+                key_length = self._HEADER.unpack_from(buf, start)[-1]
+                body = start + self._HEADER.size
+                if key_length != self._NO_KEY:
+                    key = bytes(buf[body:body + key_length]).decode("utf-8")
+                    body += key_length
+            elif version == 1:
+                body = start + self._HEADER_V1.size
+            else:
+                raise ValueError(f"Unsupported frame version: {version}")
+
+            data = None
+            if end > body:
+                data = json.loads(bytes(buf[body:end]))
+
+            msgs.append(Message(
+                Message_type(msg_type),
+                _int_to_none(src),
+                _int_to_none(dest),
+                _int_to_none(ts),
+                data,
+                key
+            ))
+            start = end
+
+        return msgs, start
+
+
+def _none_to_int(value):
+    return -1 if value is None else value
+
+
+def _int_to_none(value):
+    return None if value == -1 else value
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, BinaryCodec)}
+
+
+def get_codec(name=None):
+    """
+    Returns an instance of the selected codec.
+
+    Args:
+        name (str, optional): Name of the codec. Defaults to config.codec.
+
+    Raises:
+        ValueError: If there is no codec with that name.
+
+    Returns:
+        JsonCodec | BinaryCodec: The codec.
+    """
+    if name is None:
+        name = config.codec
+
+    if name not in CODECS:
+        raise ValueError(f"[ValueError]: Unknown codec: {name}")
+    return CODECS[name]()
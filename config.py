@@ -1,3 +1,31 @@
 numNodes = 4
 port = 20000
-exec_time = 20 
\ No newline at end of file
+addresses = None # "host:port" of each node, by id; None for localhost at port plus the id
+exec_time = 20
+rounds = 3 # Critical section entries of each node
+seed = None # Seed of the nodes' random waits; None for a different run each time
+time_scale = 1.0 # Factor applied to the nodes' random waits
+workload = "rounds" # "rounds", "poisson", "onoff" or "trace"; "rounds" runs the fixed rounds above
+arrival_rate = 10.0 # Requests per second of the whole system
+duration = 10.0 # Seconds of requests to generate
+hold_time = "constant:0" # Distribution of the time spent in the CS, e.g. "exponential:0.01"
+hotspots = 0 # Nodes that request more often than the rest
+hotspot_weight = 10.0 # How many times more often the hot-spot nodes request
+on_time = 1.0 # Mean length of the bursts of the "onoff" workload
+off_time = 4.0 # Mean length of the silences of the "onoff" workload
+trace_file = None # Requests to replay with the "trace" workload, as "time,node[,hold]" lines
+read_ratio = 0.0 # Share of the workload's requests that take the lock shared (read-only)
+quorum = "grid" # "grid" or "projective"
+quorum_cache = None # Directory to cache the quorum maps in; None to disable
+grant_forwarding = False # Hand the GRANTs over to the next node on release, saving a message delay
+sticky_grants = False # Keep the GRANTs after release until another node needs them
+codec = "json" # "json" or "binary"
+transport = "tcp" # "tcp", "unix" (Unix domain sockets, same host), "inmemory" or "shm" (shared memory, same host)
+shm_ring_size = 65536 # Bytes of the ring of each link with the "shm" transport
+socket_dir = None # Directory of the "unix" sockets of the nodes; None for a per-user one in the temporary directory
+reactor_threads = 0 # Event loops shared by all nodes; 0 for a server thread per node
+actor_threads = 0 # Threads that run the nodes' protocol state; 0 for one per node
+send_queue_size = 0 # Messages queued per outgoing link before it counts as congested; 0 to send inline
+log_mode = "sync" # "sync" or "async", to write the logs from a background thread
+event_log = None # Path of the binary event log; None to disable
+metrics_port = None # Port of the metrics HTTP endpoint on localhost; None to disable
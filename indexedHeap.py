@@ -0,0 +1,144 @@
+class IndexedHeap(object):
+    """
+    Binary min-heap of (ts, src) requests, indexed by src so any request can
+    be found and removed in O(log n). Each node has at most one request in
+    the heap; putting a new one replaces the previous. It is not
+    thread-safe: it is meant to be used by the thread that runs the
+    handlers.
+
+    Attributes:
+        heap (list): Requests, in heap order.
+        index (dict): Position in the heap of each node's request, by src.
+    """
+    def __init__(self):
+        """
+        Constructor for class IndexedHeap.
+        """
+        self.heap = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, src):
+        return src in self.index
+
+    def empty(self):
+        """
+        Returns:
+            bool: True if there are no requests; False otherwise.
+        """
+        return not self.heap
+
+    def put(self, item):
+        """
+        Inserts a request, replacing any previous one of the same node.
+
+        Args:
+            item (tuple): Request as (ts, src).
+        """
+        src = item[1]
+        if src in self.index:
+            pos = self.index[src]
+            old = self.heap[pos]
+            self.heap[pos] = item
+            if item < old:
+                self.__sift_up(pos)
+            else:
+                self.__sift_down(pos)
+        else:
+            self.heap.append(item)
+            self.index[src] = len(self.heap) - 1
+            self.__sift_up(len(self.heap) - 1)
+
+    def peek(self):
+        """
+        Returns the highest priority request without removing it.
+
+        Returns:
+            tuple: Request as (ts, src), or None if there are no requests.
+        """
+        return self.heap[0] if self.heap else None
+
+    def get(self):
+        """
+        Removes and returns the highest priority request.
+
+        Raises:
+            IndexError: If there are no requests.
+
+        Returns:
+            tuple: Request as (ts, src).
+        """
+        return self.__remove_at(0)
+
+    def remove(self, src):
+        """
+        Removes the request of a node, if there is any.
+
+        Args:
+            src (int): Id of the requesting node.
+
+        Returns:
+            tuple: Removed request as (ts, src), or None if there was none.
+        """
+        pos = self.index.get(src)
+        if pos is None:
+            return None
+        return self.__remove_at(pos)
+
+    def snapshot(self):
+        """
+        Lists the requests in priority order, leaving the heap untouched.
+
+        Returns:
+            list: Requests as (ts, src).
+        """
+        return sorted(self.heap)
+
+    def __remove_at(self, pos):
+        item = self.heap[pos]
+        last = self.heap.pop()
+        del self.index[item[1]]
+
+        # Fill the hole with the last request and restore the heap order
+        if pos < len(self.heap):
+            self.heap[pos] = last
+            self.index[last[1]] = pos
+            if last < item:
+                self.__sift_up(pos)
+            else:
+                self.__sift_down(pos)
+
+        return item
+
+    def __sift_up(self, pos):
+        heap, index = self.heap, self.index
+        item = heap[pos]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if not item < heap[parent]:
+                break
+            heap[pos] = heap[parent]
+            index[heap[pos][1]] = pos
+            pos = parent
+        heap[pos] = item
+        index[item[1]] = pos
+
+    def __sift_down(self, pos):
+        heap, index = self.heap, self.index
+        size = len(heap)
+        item = heap[pos]
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < item:
+                break
+            heap[pos] = heap[child]
+            index[heap[pos][1]] = pos
+            pos = child
+        heap[pos] = item
+        index[item[1]] = pos
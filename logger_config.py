@@ -1,4 +1,9 @@
+import atexit
 import logging
+import struct
+import time
+from queue import SimpleQueue
+from threading import Thread
 
 
 def get_file_logger(file_path: str, level=logging.DEBUG):
@@ -55,3 +60,223 @@ def get_console_logger(level=logging.INFO):
     logger.propagate = False
 
     return logger
+
+
+class AsyncWriter(Thread):
+    """
+    Background thread that takes items from a queue and writes them in
+    batches, so the threads producing them never wait for I/O.
+
+    Attributes:
+        daemon (bool): Thread's daemon option.
+        queue (SimpleQueue): Items pending to be written.
+        write_batch (callable): Writes a list of items.
+        batch_size (int): Maximum number of items per batch.
+    """
+    def __init__(self, write_batch, batch_size=512):
+        """
+        Constructor for class AsyncWriter.
+
+        Args:
+            write_batch (callable): Writes a list of items.
+            batch_size (int, optional): Maximum number of items per batch.
+                Defaults to 512.
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.queue = SimpleQueue()
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+
+    def run(self):
+        """
+        Worker for the objects of this class launched as Threads. Waits for
+        an item and writes it along with all the ones queued behind it.
+        """
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get())
+
+            # None is the signal to stop, once all previous items are written
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                running = False
+
+            self.write_batch(batch)
+
+    def stop(self):
+        """
+        Writes all pending items and stops the thread.
+        """
+        self.queue.put(None)
+        self.join()
+
+
+class _QueueHandler(logging.Handler):
+    """
+    Handler that passes records to an AsyncWriter, unformatted, along with
+    the handlers that must finally write them.
+    """
+    def __init__(self, writer, targets):
+        logging.Handler.__init__(self)
+        self.writer = writer
+        self.targets = targets
+
+    def emit(self, record):
+        self.writer.queue.put((record, self.targets))
+
+
+def _write_records(batch):
+    """
+    Formats and writes a batch of log records, flushing each handler once.
+
+    Args:
+        batch (list): Pairs of a record and the handlers to write it to.
+    """
+    written = set()
+    for record, targets in batch:
+        for target in targets:
+            if record.levelno < target.level:
+                continue
+            try:
+                if isinstance(target, logging.StreamHandler):
+                    target.stream.write(target.format(record) + target.terminator)
+                    written.add(target)
+                else:
+                    target.handle(record)
+            except Exception:
+                target.handleError(record)
+
+    for target in written:
+        target.flush()
+
+
+_log_writer = None
+
+
+def enable_async_logging(batch_size=512):
+    """
+    Moves the writing of the file and console loggers to a background
+    thread. Log calls then only queue their records: messages are formatted,
+    from their arguments, and written in batches by the background thread,
+    so threads do not contend for the handlers' locks nor wait for I/O.
+    Pending records are written when the interpreter exits.
+
+    Args:
+        batch_size (int, optional): Maximum number of records written
+            between flushes. Defaults to 512.
+    """
+    global _log_writer
+    if _log_writer is not None:
+        return
+
+    _log_writer = AsyncWriter(_write_records, batch_size)
+    _log_writer.start()
+    atexit.register(_log_writer.stop)
+
+    for logger in (logging.getLogger("file"), logging.getLogger("console")):
+        logger.handlers = [_QueueHandler(_log_writer, list(logger.handlers))]
+
+
+class BinaryEventLog(object):
+    """
+    Compact log of the messages sent and received by the nodes. Each event
+    is a fixed-size record, written in batches by an AsyncWriter:
+
+        | time (f64) | event (u8) | node (i32) | msg_type (u8) | peer (i32) | ts (i64) |
+
+    Attributes:
+        SEND (int): Event of a node sending a message to a peer.
+        RECEIVE (int): Event of a node receiving a message from a peer.
+        RECORD (struct.Struct): Layout of a record.
+        file (file): Binary file the records are appended to.
+        writer (AsyncWriter): Background writer of the records.
+    """
+    SEND = 0
+    RECEIVE = 1
+    RECORD = struct.Struct("!dBiBiq")
+
+    def __init__(self, file_path):
+        """
+        Constructor for class BinaryEventLog.
+
+        Args:
+            file_path (str): The path to the event log file.
+        """
+        self.file = open(file_path, "ab")
+        self.writer = AsyncWriter(self.__write)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def record(self, event, node, msg, peer=None):
+        """
+        Logs an event.
+
+        Args:
+            event (int): SEND or RECEIVE.
+            node (int): Id of the node that sends or receives.
+            msg (Message): Message sent or received.
+            peer (int, optional): Id of the node at the other end. Defaults
+                to the destination of a message sent or the source of a
+                message received.
+        """
+        if peer is None:
+            peer = msg.dest if event == self.SEND else msg.src
+        self.writer.queue.put(self.RECORD.pack(
+            time.time(),
+            event,
+            node,
+            msg.msg_type.value,
+            -1 if peer is None else peer,
+            -1 if msg.ts is None else msg.ts
+        ))
+
+    def __write(self, batch):
+        self.file.write(b"".join(batch))
+        self.file.flush()
+
+    def close(self):
+        """
+        Writes all pending events and closes the file.
+        """
+        if not self.file.closed:
+            self.writer.stop()
+            self.file.close()
+
+    @staticmethod
+    def read(file_path):
+        """
+        Reads the events of a log file.
+
+        Args:
+            file_path (str): The path to the event log file.
+
+        Returns:
+            list: Events as (time, event, node, msg_type, peer, ts) tuples.
+        """
+        with open(file_path, "rb") as f:
+            data = f.read()
+        return list(BinaryEventLog.RECORD.iter_unpack(data))
+
+
+_event_logs = {}
+
+
+def get_event_log(file_path):
+    """
+    Returns the binary event log for a file, shared by all its users.
+
+    Args:
+        file_path (str): The path to the event log file, or None.
+
+    Returns:
+        BinaryEventLog: The event log, or None if file_path is None.
+    """
+    if file_path is None:
+        return None
+
+    if file_path not in _event_logs:
+        _event_logs[file_path] = BinaryEventLog(file_path)
+    return _event_logs[file_path]
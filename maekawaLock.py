@@ -0,0 +1,129 @@
+from contextlib import contextmanager
+from threading import Lock
+import time
+
+
+class MaekawaLock(object):
+    """
+    Distributed lock held through a node of the system. Any number of local
+    threads may share it: they take turns on a local lock before the node
+    requests the critical section on their behalf. Locks with different
+    keys are independent and may be held at the same time. Taken shared,
+    the lock is held by any number of nodes at once, but never along with
+    an exclusive holder.
+
+        lock = mutex.lock(node_id, "orders")
+        if lock.acquire(timeout=1.0):
+            try:
+                ...
+            finally:
+                lock.release()
+
+        with lock.shared():
+            ...  # read-only work
+
+    Attributes:
+        node (Node): Node that requests the critical section.
+        key (str): Name of the lock; None for the default lock.
+    """
+    def __init__(self, node, key=None):
+        """
+        Constructor for class MaekawaLock.
+
+        Args:
+            node (Node): Node that requests the critical section. It must be
+                connected and not running its own rounds.
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+        """
+        self.node = node
+        self.key = key
+        self.__local = Lock()
+        self.__held = False
+
+    def acquire(self, timeout=None, shared=False):
+        """
+        Waits until the node is in the critical section.
+
+        Args:
+            timeout (float, optional): Seconds to wait at most. Defaults to
+                None, to wait as long as needed.
+            shared (bool, optional): True to hold the lock along with other
+                shared holders; False for exclusive access. Defaults to
+                False.
+
+        Returns:
+            bool: True if the lock was acquired; False if the time ran out,
+                in which case the request has been cancelled.
+        """
+        return self.__acquire(timeout, True, shared)
+
+    def try_acquire(self, timeout=None, shared=False):
+        """
+        Acquires the lock unless it is contended: gives up as soon as some
+        arbiter reports a higher priority request. It still waits for the
+        arbiters to answer, which takes a round trip.
+
+        Args:
+            timeout (float, optional): Seconds to wait at most. Defaults to
+                None.
+            shared (bool, optional): True to hold the lock along with other
+                shared holders; False for exclusive access. Defaults to
+                False.
+
+        Returns:
+            bool: True if the lock was acquired; False otherwise.
+        """
+        return self.__acquire(timeout, False, shared)
+
+    def __acquire(self, timeout, blocking, shared):
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        if not self.__local.acquire(blocking or timeout is not None, -1 if timeout is None else timeout):
+            return False
+
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if self.node.acquire(remaining, blocking, key=self.key, shared=shared):
+            self.__held = True
+            return True
+
+        self.__local.release()
+        return False
+
+    def release(self):
+        """
+        Leaves the critical section.
+
+        Raises:
+            RuntimeError: If the lock is not held.
+        """
+        if not self.locked():
+            raise RuntimeError("[RuntimeError]: Release of an unacquired lock")
+        self.__held = False
+        self.node.release(self.key)
+        self.__local.release()
+
+    def locked(self):
+        """
+        Returns:
+            bool: True if the lock is held through this node; False otherwise.
+        """
+        return self.__held
+
+    @contextmanager
+    def shared(self):
+        """
+        Holds the lock in shared mode for the duration of a with block.
+        """
+        self.acquire(shared=True)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -1,33 +1,129 @@
+from threading import Barrier
+import time
 from node import Node
+from maekawaLock import MaekawaLock
+import quorum
+import transport
 import config
+import logger_config
+import metrics
+import workload
 
 class MaekawaMutex(object):
     """
     Class that implements and runs Maekawa mutual exclusion algorithm
 
     Attributes:
-        nodes (list): Different nodes that form the system.
+        transport (TcpTransport | InMemoryTransport): Carries the messages
+            between the nodes.
+        quorum_map (QuorumMap): Quora of all the nodes, computed once.
+        workload (Workload): Requests of all the nodes, or None to run
+            config.rounds rounds.
+        nodes (list): Nodes of the system run by this process.
+        metrics_server (MetricsServer): Exposes the metrics of all the
+            nodes, or None if disabled.
     """
-    def __init__(self):
+    def __init__(self, node_ids=None, finish=None):
         """
         Constructor for class MaekawaMutex.
+
+        Args:
+            node_ids (iterable, optional): Ids of the nodes to run in this
+                process; see cluster.py. Defaults to None, for all
+                config.numNodes of them.
+            finish (Barrier, optional): Barrier that all the nodes of the
+                system wait on once they are done. It must be shared by the
+                processes running the system. Defaults to None, for one of
+                config.numNodes threads.
+        """
+        if config.log_mode == "async":
+            logger_config.enable_async_logging()
+        if node_ids is None:
+            node_ids = range(config.numNodes)
+        if finish is None:
+            finish = Barrier(config.numNodes)
+        self.transport = transport.get_transport()
+        self.quorum_map = quorum.get_quorum_map(config.numNodes)
+        self.workload = workload.get_workload(config.numNodes)
+        self.nodes = [Node(i, self.transport, self.quorum_map, self.workload, finish) for i in node_ids]
+        self.__nodes_by_id = {node.id: node for node in self.nodes}
+
+        self.metrics_server = None
+        self.__connected = False
+        self.__locks = {}
+        if config.metrics_port is not None:
+            self.metrics_server = metrics.MetricsServer([node.metrics for node in self.nodes], config.metrics_port)
+            self.metrics_server.start()
+
+    def snapshot(self):
+        """
+        Takes a copy of the metrics of all the nodes.
+
+        Returns:
+            list: Snapshot of each node, as NodeMetrics.snapshot returns.
         """
-        self.nodes =[Node(i) for i in range(config.numNodes)]
+        return [node.metrics.snapshot() for node in self.nodes]
 
     def define_connections(self):
         """
-        Establishes the connections for each node to all others.
+        Establishes the connections for each node to its quorum and to the
+        nodes it arbitrates for. It only does so once.
         """
+        if self.__connected:
+            return
+        self.__connected = True
+
         for node in self.nodes:
             node.do_connections()
 
-    def run(self):
+    def lock(self, node_id, key=None):
+        """
+        Returns a lock held through a node, for embedding the mutex in an
+        application instead of calling run. All the locks share the nodes'
+        connections and threads, and the same node and key always give the
+        same lock, whether it is taken shared or exclusive.
+
+        Args:
+            node_id (int): Id of the node. It must be run by this process.
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+
+        Returns:
+            MaekawaLock: Lock of the node.
+        """
+        self.define_connections()
+        if (node_id, key) not in self.__locks:
+            self.__locks[node_id, key] = MaekawaLock(self.__nodes_by_id[node_id], key)
+        return self.__locks[node_id, key]
+
+    def run(self, origin=None):
         """
         Starts all nodes as threads and waits for them all to finish.
+
+        Args:
+            origin (float, optional): Monotonic time at which the workload
+                starts. Defaults to now.
         """
         self.define_connections()
+
+        # All the nodes share the same time origin for the workload
+        if origin is None:
+            origin = time.monotonic()
         for node in self.nodes:
+            node.origin = origin
             node.start()
 
         for node in self.nodes:
             node.join()
+
+    def close(self):
+        """
+        Releases the nodes' actors and links, the transport with the
+        nodes' servers and the metrics server, so that another system can
+        be created in the same process, at the same addresses.
+        """
+        for node in self.nodes:
+            node.close()
+        self.transport.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
@@ -11,6 +11,8 @@ class Message_type(Enum):
     REQUEST = 3
     GRANT = 4
     RELEASE = 5
+    NEXT = 6
+    FORWARD = 7
 
 class Message(object):
     """
@@ -22,6 +24,8 @@ class Message(object):
         dest (int): Id of the message receiver.
         ts (int): Lamport timestamp of the message sending.
         data (any, optional): Content of the message. Defaults to None.
+        key (str, optional): Name of the lock the message is about. Defaults
+            to None, for the default lock.
     """
     def __init__(self,
             msg_type=None,
@@ -29,6 +33,7 @@ class Message(object):
             dest=None,
             ts=None,
             data=None,
+            key=None,
             ):
         """
         Constructor for class Message.
@@ -39,12 +44,15 @@ class Message(object):
             dest (int): Id of the message receiver. Defaults to None.
             ts (int): Lamport timestamp of the message sending. Defaults to None.
             data (any, optional): Content of the message. Defaults to None.
+            key (str, optional): Name of the lock the message is about.
+                Defaults to None, for the default lock.
         """
         self.msg_type = msg_type
         self.src = src
         self.dest = dest
         self.ts = ts
         self.data = data
+        self.key = key
 
     def __json__(self):
         """
@@ -57,7 +65,8 @@ class Message(object):
             src=self.src,
             dest=self.dest, 
             ts=self.ts, 
-            data=self.data)
+            data=self.data,
+            key=self.key)
     
     def __str__(self):
         """
@@ -66,7 +75,9 @@ class Message(object):
         Returns:
             str: String displaying the fields of the message.
         """
-        return f"Message({self.msg_type}, {self.src}, {self.dest}, {self.ts}, {self.data})"
+        if self.key is None:
+            return f"Message({self.msg_type}, {self.src}, {self.dest}, {self.ts}, {self.data})"
+        return f"Message({self.msg_type}, {self.src}, {self.dest}, {self.ts}, {self.data}, {self.key})"
 
     def set_type(self, msg_type):
         """
@@ -113,6 +124,15 @@ class Message(object):
         """
         self.data = data
 
+    def set_key(self, key):
+        """
+        Setter for the key field.
+
+        Args:
+            key (str): Name of the lock the message is about.
+        """
+        self.key = key
+
     def to_json(self):
         """
         Serializes the JSON representation of the Message.
@@ -126,6 +146,8 @@ class Message(object):
         obj_dict['dest'] = self.dest
         obj_dict['ts'] = self.ts
         obj_dict['data'] = self.data
+        if self.key is not None:
+            obj_dict['key'] = self.key
         return json.dumps(obj_dict)
 
     @staticmethod
@@ -144,7 +166,8 @@ class Message(object):
             src=msg['src'],
             dest=msg['dest'],
             ts=msg['ts'],
-            data=msg['data']
+            data=msg['data'],
+            key=msg.get('key')
         )
     
     @staticmethod
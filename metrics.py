@@ -0,0 +1,417 @@
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+import statistics
+import time
+from message import Message_type
+
+# Critical section intervals kept by each node, as samples of the latency
+# and synchronization delay
+MAX_INTERVALS = 10000
+
+# Upper bounds, in seconds, of the latency histograms' buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, float("inf"))
+
+
+class Histogram(object):
+    """
+    Distribution of observed values, counted in cumulative buckets like a
+    Prometheus histogram. It is not thread-safe by itself.
+
+    Attributes:
+        bounds (tuple): Upper bound of each bucket, the last one infinite.
+        counts (list): Number of observations that fall in each bucket.
+        sum (float): Sum of all the observations.
+        count (int): Number of observations.
+    """
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        """
+        Constructor for class Histogram.
+
+        Args:
+            bounds (tuple, optional): Upper bound of each bucket, the last
+                one infinite. Defaults to LATENCY_BUCKETS.
+        """
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Adds an observation.
+
+        Args:
+            value (float): Observed value.
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        """
+        Adds all the observations of another histogram with the same bounds.
+
+        Args:
+            other (Histogram): Histogram to merge.
+        """
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """
+        Estimates a quantile by linear interpolation within its bucket, as
+        Prometheus' histogram_quantile does.
+
+        Args:
+            q (float): Quantile, between 0 and 1.
+
+        Returns:
+            float: Estimated value, or None if there are no observations.
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i]
+                if upper == float("inf"):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-2]
+
+    def copy(self):
+        """
+        Returns:
+            Histogram: Independent copy of the histogram.
+        """
+        other = Histogram(self.bounds)
+        other.merge(self)
+        return other
+
+
+class NodeMetrics(object):
+    """
+    Protocol metrics of a node. All methods are thread-safe.
+
+    Attributes:
+        node_id (int): Id of the node.
+        clock (callable): Returns the current time, in seconds.
+        start_time (float): Time of creation.
+        sent (dict): Messages sent, by Message_type.
+        received (dict): Messages received, by Message_type.
+        grant_wait (Histogram): Seconds from sending a REQUEST until all the
+            grants are received.
+        cs_hold (Histogram): Seconds spent in the critical section.
+        cs_intervals (deque): Latest (arrival, enter, exit) times
+            of the node's critical sections.
+        queue_depth (int): Requests currently queued at this node as arbiter.
+        max_queue_depth (int): Highest queue depth seen.
+        cancelled (int): Requests given up before entering the CS.
+    """
+    def __init__(self, node_id, clock=time.monotonic):
+        """
+        Constructor for class NodeMetrics.
+
+        Args:
+            node_id (int): Id of the node.
+            clock (callable, optional): Returns the current time, in
+                seconds. Defaults to time.monotonic.
+        """
+        self.node_id = node_id
+        self.clock = clock
+        self.start_time = clock()
+        self.sent = {t: 0 for t in Message_type}
+        self.received = {t: 0 for t in Message_type}
+        self.grant_wait = Histogram()
+        self.cs_hold = Histogram()
+        self.cs_intervals = deque(maxlen=MAX_INTERVALS)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.cancelled = 0
+        self.__lock = Lock()
+
+    def message_sent(self, msg_type, count=1):
+        """
+        Counts messages sent.
+
+        Args:
+            msg_type (Message_type): Type of the messages.
+            count (int, optional): Number of messages. Defaults to 1.
+        """
+        with self.__lock:
+            self.sent[msg_type] += count
+
+    def message_received(self, msg_type):
+        """
+        Counts a message received.
+
+        Args:
+            msg_type (Message_type): Type of the message.
+        """
+        with self.__lock:
+            self.received[msg_type] += 1
+
+    def observe_grant_wait(self, seconds):
+        """
+        Records the time waited for all the grants of a request.
+
+        Args:
+            seconds (float): Time waited.
+        """
+        with self.__lock:
+            self.grant_wait.observe(seconds)
+
+    def record_cs(self, arrival_time, enter_time, exit_time):
+        """
+        Records a critical section of the node.
+
+        Args:
+            arrival_time (float): Time the demand arrived, which the
+                acquire latency is measured from.
+            enter_time (float): Time the node entered.
+            exit_time (float): Time the node left.
+        """
+        with self.__lock:
+            self.cs_hold.observe(exit_time - enter_time)
+            self.cs_intervals.append((arrival_time, enter_time, exit_time))
+
+    def request_cancelled(self):
+        """
+        Counts a request given up before entering the CS.
+        """
+        with self.__lock:
+            self.cancelled += 1
+
+    def set_queue_depth(self, depth):
+        """
+        Updates the number of requests queued at this node as arbiter.
+
+        Args:
+            depth (int): Number of queued requests.
+        """
+        with self.__lock:
+            self.queue_depth = depth
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+    def snapshot(self):
+        """
+        Takes a consistent copy of all the metrics.
+
+        Returns:
+            dict: Metrics by name. Counters are dicts by message type name,
+                rates are per second since the node was created.
+        """
+        with self.__lock:
+            uptime = self.clock() - self.start_time
+            sent = {t.name: n for t, n in self.sent.items()}
+            received = {t.name: n for t, n in self.received.items()}
+            return {
+                "node": self.node_id,
+                "uptime": uptime,
+                "sent": sent,
+                "received": received,
+                "rates": {t: sent[t] / uptime if uptime else 0.0 for t in ("INQUIRE", "YIELD", "FAILED")},
+                "cs_entries": self.cs_hold.count,
+                "grant_wait": self.grant_wait.copy(),
+                "cs_hold": self.cs_hold.copy(),
+                "cs_intervals": list(self.cs_intervals),
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "cancelled": self.cancelled,
+            }
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of values.
+
+    Args:
+        values (list): Values, in any order.
+        q (float): Percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile, or None if there are no values.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, round(q / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+
+def sync_delays(intervals):
+    """
+    Synchronization delays of a run: the time from a node leaving the
+    critical section until the next one enters, counted only when the next
+    one was already waiting. Sections that overlap, being shared, are not
+    counted.
+
+    Args:
+        intervals (list): (request, enter, exit) times of all the critical
+            sections of the run.
+
+    Returns:
+        list: Delays, in seconds.
+    """
+    intervals = sorted(intervals, key=lambda interval: interval[1])
+    delays = []
+    for (_, _, exit_time), (request, enter, _) in zip(intervals, intervals[1:]):
+        if request <= exit_time <= enter:
+            delays.append(enter - exit_time)
+    return delays
+
+
+def summarize(snapshots, elapsed):
+    """
+    Aggregates the snapshots of all the nodes of a run.
+
+    Args:
+        snapshots (list): Snapshot of each node.
+        elapsed (float): Duration of the run, in seconds.
+
+    Returns:
+        dict: Throughput, synchronization delay, messages per entry and
+            acquire latency of the run.
+    """
+    intervals = [interval for s in snapshots for interval in s["cs_intervals"]]
+    acquire = [enter - arrival for arrival, enter, _ in intervals]
+    delays = sync_delays(intervals)
+    messages = sum(sum(s["sent"].values()) for s in snapshots)
+
+    # The intervals are capped at MAX_INTERVALS per node and only serve as
+    # samples; the entries are counted by the hold time histograms
+    entries = sum(s["cs_entries"] for s in snapshots)
+
+    def total(msg_type):
+        return sum(s["sent"][msg_type] for s in snapshots)
+
+    return {
+        "nodes": len(snapshots),
+        "entries": entries,
+        "elapsed": elapsed,
+        "entries_per_sec": entries / elapsed if elapsed else None,
+        "messages": messages,
+        "messages_per_entry": messages / entries if entries else None,
+        "sync_delay_mean": statistics.mean(delays) if delays else None,
+        "sync_delay_p50": percentile(delays, 50),
+        "acquire_p50": percentile(acquire, 50),
+        "acquire_p99": percentile(acquire, 99),
+        "inquires": total("INQUIRE"),
+        "yields": total("YIELD"),
+        "failed": total("FAILED"),
+        "max_queue_depth": max(s["max_queue_depth"] for s in snapshots),
+    }
+
+
+def to_prometheus(snapshots):
+    """
+    Renders node snapshots in the Prometheus text exposition format.
+
+    Args:
+        snapshots (list): Snapshots taken with NodeMetrics.snapshot.
+
+    Returns:
+        str: Metrics in text format.
+    """
+    lines = []
+
+    def family(name, kind, help):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for key, help in (("sent", "Messages sent, by type."),
+                      ("received", "Messages received, by type.")):
+        name = f"maekawa_messages_{key}_total"
+        family(name, "counter", help)
+        for s in snapshots:
+            for t, n in s[key].items():
+                lines.append(f'{name}{{node="{s["node"]}",type="{t}"}} {n}')
+
+    for key, help in (("grant_wait", "Seconds from REQUEST until all grants are received."),
+                      ("cs_hold", "Seconds spent in the critical section.")):
+        name = f"maekawa_{key}_seconds"
+        family(name, "histogram", help)
+        for s in snapshots:
+            histogram = s[key]
+            cumulative = 0
+            for bound, n in zip(histogram.bounds, histogram.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{node="{s["node"]}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{node="{s["node"]}"}} {histogram.sum}')
+            lines.append(f'{name}_count{{node="{s["node"]}"}} {histogram.count}')
+
+    family("maekawa_cancelled_total", "counter", "Requests given up before entering the CS.")
+    for s in snapshots:
+        lines.append(f'maekawa_cancelled_total{{node="{s["node"]}"}} {s["cancelled"]}')
+
+    family("maekawa_queue_depth", "gauge", "Requests queued at the node as arbiter.")
+    for s in snapshots:
+        lines.append(f'maekawa_queue_depth{{node="{s["node"]}"}} {s["queue_depth"]}')
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer(Thread):
+    """
+    HTTP server on localhost that exposes the metrics of a set of nodes at
+    /metrics, in the Prometheus text format.
+
+    Attributes:
+        daemon (bool): Thread's daemon option.
+        registry (list): NodeMetrics of the exposed nodes.
+        httpd (ThreadingHTTPServer): The HTTP server.
+    """
+    def __init__(self, registry, port):
+        """
+        Constructor for class MetricsServer.
+
+        Args:
+            registry (list): NodeMetrics of the exposed nodes.
+            port (int): Port to listen to.
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.registry = registry
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = to_prometheus([m.snapshot() for m in server.registry]).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                None
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+    def run(self):
+        """
+        Worker for the objects of this class launched as Threads.
+        """
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """
+        Stops serving and closes the server socket.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,25 +1,19 @@
-from queue import PriorityQueue
-from threading import Thread, Condition
-from math import ceil, sqrt
+from threading import Barrier, Thread
+from math import ceil
 import time
 from nodeServer import NodeServer
 from nodeSend import NodeSend
-from message import Message, Message_type
+from protocol import MaekawaProtocol, flog, clog
+from actor import Reply, get_actor
 import config
-import logger_config
-from datetime import datetime
 import random
+import utils
 
-#LOG_FILE_PATH = f"logs/{datetime.now().strftime("%Y%m%d_%H%M%S")}.log"
-
-LOG_FILE_PATH = "logs/log.log"
-
-flog = logger_config.get_file_logger(LOG_FILE_PATH, logger_config.logging.DEBUG)
-clog = logger_config.get_console_logger(logger_config.logging.INFO)
-
-class Node(Thread):
+class Node(Thread, MaekawaProtocol):
     """
-    Represents a Node of the distributed system.
+    Represents a Node of the distributed system. The handlers of Maekawa's
+    algorithm are inherited from MaekawaProtocol, and run by the node's
+    actor along with the requests and releases of its local threads.
 
     Attributes:
         id (int): Numerical identifier of the Node.
@@ -27,422 +21,285 @@ class Node(Thread):
         daemon (bool): Thread's daemon option.
         lamport_ts (int): Lamport timestamp of the last message sent.
         server (NodeServer): Server for handling the incoming messages.
+        transport (TcpTransport | InMemoryTransport): Carries the messages.
         client (Nodesend): Client for handling message sending.
-        collegues (list): Colleagues in the Node's quorum.
-        condition (Condition): Condition upon which entering the CS is allowed
-        queue (PriorityQueue): Stores other nodes' requests based on priority.
-        grants_sent (tuple): Highest priority node to which a GRANT is sent.
-        grants_received (set): IDs of the nodes that have conceded a GRANT.
-        yielded (bool): True if the node has already yielded; False otherwise.
-        failed (bool): True if the node has received a FAILED; False otherwise.
-        in_CS (bool): True if the node is in the critical section; False otherwise.
+        actor (Actor): Owner of the node's protocol state.
+        quorum_map (QuorumMap): Quora of all the nodes of the system.
+        collegues (tuple): Colleagues in the Node's quorum.
+        locks (dict): State of each named lock in use, by key.
+        workload (Workload): Requests of the node, or None to run
+            config.rounds rounds.
+        origin (float): Monotonic time at which the workload starts.
+        finish (Barrier): Waited on by every node of the system once it is
+            done, so that it keeps arbitrating until the rest are.
     """
-    _FINISHED_NODES = 0
-    _HAVE_ALL_FINISHED = Condition()
-
-    def __init__(self,id):
+    def __init__(self, id, transport, quorum_map, workload=None, finish=None):
         """
         Constructor for class Noed.
 
         Args:
             id (int): Numerical identifier of the Node.
+            transport (TcpTransport | InMemoryTransport): Carries the
+                messages. Shared by all nodes.
+            quorum_map (QuorumMap): Quora of all the nodes. Shared by all
+                nodes.
+            workload (Workload, optional): Requests of all the nodes. Defaults
+                to None, to run config.rounds rounds.
+            finish (Barrier, optional): Barrier of all the nodes of the
+                system, possibly in other processes. Defaults to None, for
+                one of config.numNodes threads.
         """
         Thread.__init__(self)
         self.id = id
-        self.port = config.port+id
+        self.port = utils.node_address(id)[1]
         self.daemon = True
-        self.lamport_ts = 0
-        self.__form_colleagues()
-        self.server = NodeServer(self) 
-        self.server.start()
+        self._init_protocol(quorum_map, config.grant_forwarding, config.sticky_grants)
+        self.actor = get_actor(id)
+        self.__replies = {}
+        self.transport = transport
+        self.server = NodeServer(self)
+        self.transport.listen(self.server)
         self.client = NodeSend(self)
-        self.condition = Condition()
-        self.queue = PriorityQueue()
-        self.grants_sent = None
-        self.grants_received = set()
-        self.yielded = False
-        self.failed = False
-        self.in_CS = False
+        self.workload = workload
+        self.origin = None
+        self.finish = Barrier(config.numNodes) if finish is None else finish
 
 
-    def __queue_tostr(self):
+    def do_connections(self):
         """
-        Converts the contents of a PriorityQueue to a formatted string,
-        preserving the order.
-
-        Returns:
-            string: formatted string representation of the queue contents
+        Connect to the members of the quorum, and to the nodes whose requests
+        this one arbitrates, through the transport.
         """
-        q = []
-        while not self.queue.empty():
-            q.append(self.queue.get())
-        
-        for n in q:
-            self.queue.put(n)
-        
-        return f"\t\tts_{self.lamport_ts}: Queue of Node_{self.id}: {q}"
-    
+        self.client.build_connection()
 
-    def __form_colleagues(self):
+    def run(self):
         """
-        Form the quorum for the Node. If all nodes are displayed in a NxN
-        matrix, row-major ordered by node id, colleagues shall be those on the
-        same row or on the same column as the Node. Since Maekawa's algorithm
-        requires all quora to have the same number of nodes, there must be a
-        number of nodes that makes full rows.
+        Run simulacrum scenario of multiple accesses to a critical section
+        using Maekawa's algorithm for mutual exclusion.
         """
+        flog.info("Run Node%i with the follows %s", self.id, self.collegues)
+        clog.info("Run Node%i with the follows %s", self.id, self.collegues)
 
-        # The dimension of the matrix rounded op from the square root of the
-        # number of nodes.
-        num_rows = ceil(sqrt(config.numNodes))
-        colleague_matrix = []
-        cont = True
+        self.client.start()
 
-        # Form all rows
-        for i in range(num_rows):
-            if not cont:
-                break
+        if self.workload is None:
+            self.__run_rounds()
+        else:
+            self.__run_workload()
 
-            # Form each row
-            row = []
-            for j in range(num_rows):
-                pos = i * num_rows + j
+        # Let the actor send the last release before waiting
+        self.actor.sync()
 
-                # When the position reaches the number of nodes, finish
-                if  pos >= config.numNodes:
-                    cont = False
-                    break
+        # Wait for all nodes to finish
+        flog.info("Node_%i is waiting for all nodes to finish", self.id)
+        clog.info("Node_%i is waiting for all nodes to finish", self.id)
+        self._finished()
 
-                row.append(i * num_rows + j)
-            colleague_matrix.append(row)
+        flog.info("Node_%i DONE!", self.id)
+        clog.info("Node_%i DONE!", self.id)
 
-        # List colleagues from the same row and the same column as the Node
-        row_colleagues = [i for row in colleague_matrix for i in row if self.id in row]
-        col_colleagues = [i for row in colleague_matrix for i in row if (i % num_rows) == (self.id % num_rows)]
 
-        # Create quorum
-        self.collegues = []
-        for i in row_colleagues:
-            if i != self.id:
-                self.collegues.append(i)
-        for i in col_colleagues:
-            self.collegues.append(i)
+    def __run_rounds(self):
+        """
+        Enters the critical section config.rounds times, each one after a
+        random wait.
+        """
+        # Seed each node apart so that runs with the same seed repeat
+        if config.seed is None:
+            rng = random
+        else:
+            rng = random.Random(config.seed * 1000003 + self.id)
 
+        self.wakeupcounter = 0
+        while self.wakeupcounter < config.rounds: # Termination criteria
 
-    def request_handler(self, msg):
-        """
-        Handler for REQUEST type messages. Cases:
-            
-            - This node hasn't sent any GRANT yet -> send GRANT
-            - This node has sent a GRANT to some higher priority node -> 
-                enqueue requester and send INQUIRE to the higher priority node
-            - This node has sent a GRANT to non-higher priority nodes ->
-                send FAILED to requester and enqueue it
+            # Make nodes start at different times
+            min_time = 20
+            max_time = ceil(config.numNodes * 7.5) + min_time
+            time_offset = rng.randint(min_time, max_time)
+            time.sleep(time_offset / 10 * config.time_scale)
 
-        Args:
-            msg (Message): the Message containing the REQUEST
-        """
+            self.__critical_section()
 
-        # Get the highest priority node that has received a GRANT from this
-        if self.grants_sent:
-            hp_ts, hp_src = self.grants_sent
-
-            # Reply with a FAILED if it has sent a GRANT to a higher
-            # priority node and put the request in the queue.
-            if (hp_ts, hp_src) < (msg.ts, msg.src):
-                rep = Message(
-                        Message_type.FAILED,
-                        self.id,
-                        msg.src,
-                        self.lamport_ts
-                    )
-
-                self.client.send_message(rep, msg.src)
-                self.queue.put((msg.ts, msg.src))
-
-                flog.debug("Node_%i send msg: %s"%(self.id, rep))
-                flog.debug(self.__queue_tostr())
-                clog.debug("Node_%i send msg: %s"%(self.id, rep))
-                clog.debug(self.__queue_tostr())
-                
-
-            # Send an INQUIRE to the highest priority node which has given
-            # a GRANT to because the requesting one has more priority.
-            else:
-                rep = Message(
-                        Message_type.INQUIRE,
-                        self.id,
-                        hp_src,
-                        self.lamport_ts,
-                        (msg.ts, msg.src)
-                    )
-
-                self.client.send_message(rep, hp_src)
-                self.queue.put((msg.ts, msg.src))
-
-                flog.debug("Node_%i send msg: %s"%(self.id, rep))
-                flog.debug(self.__queue_tostr())
-                clog.debug("Node_%i send msg: %s"%(self.id, rep))
-                clog.debug(self.__queue_tostr())
-
-        # Reply directly with a GRANT if no other GRANTs have been sent.
-        else:
-            rep = Message(
-                    Message_type.GRANT,
-                    self.id,
-                    msg.src,
-                    self.lamport_ts
-                )
+            # Control iteration 
+            self.wakeupcounter += 1 
 
-            self.client.send_message(rep, msg.src)
-            self.grants_sent = (msg.ts, msg.src)
 
-            flog.debug("Node_%i send msg: %s"%(self.id, rep))
-            flog.debug(self.__queue_tostr())
-            clog.debug("Node_%i send msg: %s"%(self.id, rep))
-            clog.debug(self.__queue_tostr())       
+    def __run_workload(self):
+        """
+        Serves the node's requests of the workload, open-loop: each one is
+        issued at its arrival time or, if the node is still busy with an
+        earlier one, as soon as that one is released.
+        """
+        for arrival, hold, shared in self.workload.requests(self.id):
+            arrival_time = self.origin + arrival
+            delay = arrival_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
 
+            self.__critical_section(arrival_time, hold, shared)
 
 
-    def yield_handler(self, msg):
+    def __critical_section(self, arrival_time=None, hold=0, shared=False):
         """
-        Handler for YIELD type messages. Puts the yielding node in the queue
-        and removes the grant previously sent to it.
+        Requests the critical section, waits for all the grants, holds the
+        section and releases it.
 
         Args:
-            msg (Message): Message containing the YIELD
+            arrival_time (float, optional): Monotonic time the demand
+                arrived. Defaults to now.
+            hold (float, optional): Seconds to hold the section. Defaults
+                to 0.
+            shared (bool, optional): True to share the section with other
+                shared requests. Defaults to False.
         """
+        self.acquire(arrival_time=arrival_time, shared=shared)
+        
+        # ENTER CRITICAL SECTION
+        flog.info("[Node_%i]: Greetings from the critical section!", self.id)
+        clog.info("[Node_%i]: Greetings from the critical section!", self.id)
+        if hold:
+            time.sleep(hold)
+        # EXIT CRITICAL SECTION
 
-        # Put the yielding node in the queue
-        self.queue.put((msg.ts, msg.src))
+        self.release()
 
-        # Clear the grant sent to the yielding node
-        if self.grants_sent and (msg.ts, msg.src) == self.grants_sent:
-            self.grants_sent = None
-        
-        # Get the info of the highest priority request in the queue
-        if not self.queue.empty():
-            q_ts, q_src = self.queue.get()
 
-            # Send a GRANT to the highest priority request in the queue and put
-            # the yielding node in the queue.
-            rep = Message(
-                    Message_type.GRANT,
-                    self.id,
-                    q_src,
-                    self.lamport_ts
-                )
+    def acquire(self, timeout=None, blocking=True, arrival_time=None, key=None, shared=False):
+        """
+        Requests the critical section and waits for the grants of all the
+        quorum. If they do not arrive in time, the request is cancelled.
+        While the links to the quorum are congested, the request is held
+        back until they drain. Only one thread of the node may call it at a
+        time; see MaekawaLock.
+
+        Args:
+            timeout (float, optional): Seconds to wait at most. Defaults to
+                None, to wait until entering.
+            blocking (bool, optional): False to give up as soon as some
+                arbiter reports a higher priority request. Defaults to True.
+            arrival_time (float, optional): Monotonic time the demand
+                arrived. Defaults to now.
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+            shared (bool, optional): True to share the section with other
+                shared requests; False for exclusive access. Defaults to
+                False.
 
-            self.client.send_message(rep, q_src)
+        Returns:
+            bool: True if the node is in the critical section; False if the
+                request was cancelled or could not be sent in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
 
-            flog.debug("Node_%i send msg: %s"%(self.id, rep))
-            flog.debug(self.__queue_tostr())
-            clog.debug("Node_%i send msg: %s"%(self.id, rep))
-            clog.debug(self.__queue_tostr())
+        # Do not add to the backlog of congested links
+        if not self.client.wait_ready(self.collegues, timeout):
+            return False
 
-            # Update the highest prioriry GRANT sent
-            self.grants_sent = (q_ts, q_src)
+        # Send requests to all quorum peers and wait for unanimous grant
+        reply = Reply()
+        self.actor.post(self.__request, reply, arrival_time, key, shared, blocking)
 
-            flog.debug(f"\t\tHP_GRANT Node_{self.id}: {self.grants_sent}")
-            clog.debug(f"\t\tHP_GRANT Node_{self.id}: {self.grants_sent}")
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not reply.wait(remaining):
+            # Give up, unless the grants arrive meanwhile
+            self.actor.post(self.__give_up, reply, key)
+            reply.wait()
+        return reply.value
 
 
-    def release_handler(self, msg):
+    def __request(self, reply, arrival_time, key, shared, blocking):
         """
-        Handler for RELEASE type messages. Removes the releasing node from both
-        the queue and the list of grants sent, and then sents a GRANT to the
-        request at the head of the queue.
+        Sends a request on behalf of a local thread. Run by the actor.
 
         Args:
-            msg (Message): message containing the RELEASE
+            reply (Reply): Set to whether the node entered the CS.
+            arrival_time (float): Monotonic time the demand arrived.
+            key (str): Name of the lock.
+            shared (bool): True for a shared request.
+            blocking (bool): False to give up on a higher priority request.
         """
+        self.__replies[key] = (reply, blocking)
+        self.request_cs(arrival_time, key, shared)
 
-        # Remove the releasing node from the queue and grants_sent
-        if self.grants_sent and (msg.ts, msg.src) == self.grants_sent:
-            self.grants_sent = None
-
-        new_queue = PriorityQueue()
-        while  not self.queue.empty():
-            q_ts, q_src = self.queue.get()
-            if q_src == msg.src:
-                continue
-            new_queue.put((q_ts, q_src))
-        self.queue = new_queue
-
-        # Sent a GRANT to the request with the highest priority
-        if not self.queue.empty():
-
-            q_ts, q_src = self.queue.get()
-            rep = Message(
-                    Message_type.GRANT,
-                    self.id,
-                    q_src,
-                    self.lamport_ts
-                )
-
-            self.client.send_message(rep, q_src)
-
-            flog.debug("Node_%i send msg: %s"%(self.id, rep))
-            flog.debug(self.__queue_tostr())
-            clog.debug("Node_%i send msg: %s"%(self.id, rep))
-            clog.debug(self.__queue_tostr())
-
-            # Update the highest priority GRANT sent
-            self.grants_sent = (q_ts, q_src)
-
-            flog.debug(f"\t\tHP_GRANT Node_{self.id}: {self.grants_sent}")
-            clog.debug(f"\t\tHP_GRANT Node_{self.id}: {self.grants_sent}")
-        
-        else:
-            self.grants_sent = None
-                         
 
-    def inquire_handler(self, msg):
+    def __give_up(self, reply, key):
         """
-        Handler for INQUIRE type messages. If the node hasn't yet gotten into
-        the critical section, replies with a YIELD message.
+        Cancels a request, unless it has already entered the CS or been
+        cancelled. Run by the actor.
 
         Args:
-            msg (Message): message containing the INQUIRE
+            reply (Reply): Reply of the request.
+            key (str): Name of the lock.
         """
-        rep = None
-
-        # If it hasn't got the CS, yield
-        with self.condition:
-            if not self.in_CS:  
-                rep = Message(
-                        Message_type.YIELD,
-                        self.id,
-                        msg.src,
-                        self.lamport_ts
-                    )
-               
-                self.yielded = True
-
-                # Clear the yielding node from the grants received
-                if msg.src in self.grants_received:
-                    self.grants_received.remove(msg.src)
-
-        # Send yield message if created
-        if rep:
-             self.client.send_message(rep, msg.src)
-             flog.debug("Node_%i send msg: %s"%(self.id, rep))
-             flog.debug(self.__queue_tostr())
-             clog.debug("Node_%i send msg: %s"%(self.id, rep))
-             clog.debug(self.__queue_tostr())
-
-
-    def grant_handler(self, msg):
+        if self.__replies.get(key, (None,))[0] is not reply:
+            return
+
+        del self.__replies[key]
+        self.cancel_cs(key)
+        reply.set(False)
+
+
+    def _all_granted(self, state):
         """
-        Handler for GRANT type messages. Adds the GRANT to its own list and
-        clears failed and yielded conditions. Notifies if it has gotten all
-        the grants from peers.
+        Enters the CS and wakes up the thread waiting for it.
 
         Args:
-            msg (Message): message containing the GRANT
+            state (LockState): State of the granted lock.
         """
-        with self.condition:
-            self.grants_received.add(msg.src)
-            self.yielded = False
-            self.failed = False
+        reply, blocking = self.__replies.pop(state.key)
+        self._enter_cs(state)
+        reply.set(True)
 
-            if not len(self.grants_received) < len(self.collegues):
-                self.condition.notify()
 
-
-    def failed_handler(self, msg):
+    def _rejected(self, state):
         """
-        Handler for FAILED type messages. Sets the failed and yielded
-        conditions.
+        Gives up a non-blocking request once the messages being handled
+        have been sent.
 
         Args:
-            msg (Message): message containing the FAILED
+            state (LockState): State of the rejected lock.
         """
-        with self.condition:
-            self.failed = True
-            self.yielded = True    
-            
+        reply, blocking = self.__replies.get(state.key, (None, True))
+        if not blocking:
+            self.actor.post(self.__give_up, reply, state.key)
 
 
-    def do_connections(self):
-        """
-        Connect to all other nodes via socket.
+    def release(self, key=None):
         """
-        self.client.build_connection()
+        Leaves the critical section, sending release messages to all quorum
+        peers. It does not wait for the actor to send them.
 
-    def run(self):
-        """
-        Run simulacrum scenario of multiple accesses to a critical section
-        using Maekawa's algorithm for mutual exclusion.
+        Args:
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
         """
-        flog.info("Run Node%i with the follows %s"%(self.id,self.collegues))
-        clog.info("Run Node%i with the follows %s"%(self.id,self.collegues))
+        self.actor.post(self.release_cs, key)
 
-        # Members of the quorum that are not this node
-        multicast_group = [n for n in self.collegues if n != self.id]
 
-        self.client.start()
+    def congested(self):
+        """
+        Tells which outgoing links have reached config.send_queue_size
+        pending messages. New requests wait for the links to their quorum to
+        drain; the handlers keep granting and queueing meanwhile.
 
-        self.wakeupcounter = 0
-        while self.wakeupcounter <= 2: # Termination criteria
+        Returns:
+            list: Ids of the nodes whose links are congested.
+        """
+        return self.client.congested()
 
-            # Make nodes start at different times
-            min_time = 20
-            max_time = ceil(config.numNodes * 7.5) + min_time
-            time_offset = random.randint(min_time, max_time)
-            time.sleep(time_offset / 10)
-
-            # Send requests to all quorum peers
-            self.grants_received.add(self.id)
-
-            req = Message(
-                    msg_type=Message_type.REQUEST,
-                    src=self.id,
-                    ts=self.lamport_ts
-                )
-
-            self.client.multicast(req, multicast_group)
-
-            flog.debug("Node_%i send msg: %s"%(self.id, req))
-            clog.debug("Node_%i send msg: %s"%(self.id, req))
-
-            # Wait for unanimous grant
-            with self.condition:
-                while len(self.grants_received) < len(self.collegues):
-                    self.condition.wait()
-                
-                self.in_CS = True
-            
-            # ENTER CRITICAL SECTION
-            flog.info(f"[Node_{self.id}]: Greetings from the critical section!")
-            clog.info(f"[Node_{self.id}]: Greetings from the critical section!")
-            # EXIT CRITICAL SECTION
-
-            with self.condition:
-                self.grants_received.clear()
-                self.in_CS = False
-
-            # Send release messages to all quorum peers
-            rel = Message(
-                    msg_type=Message_type.RELEASE,
-                    src=self.id,
-                    ts=self.lamport_ts
-                )
-            
-            self.client.multicast(rel, multicast_group)
-            flog.debug("Node_%i send msg: %s"%(self.id, req))
-            clog.debug("Node_%i send msg: %s"%(self.id, req))
 
-            # Control iteration 
-            self.wakeupcounter += 1 
-                
-        # Wait for all nodes to finish
-        flog.info("Node_%i is waiting for all nodes to finish"%self.id)
-        clog.info("Node_%i is waiting for all nodes to finish"%self.id)
-        self._finished()
-
-        flog.info("Node_%i DONE!"%self.id)
-        clog.info("Node_%i DONE!"%self.id)
+    def close(self):
+        """
+        Stops the node's actor, unless it is shared with other nodes, and
+        closes the node's links once the actor has sent what was posted.
+        """
+        if config.actor_threads:
+            self.actor.sync()
+        else:
+            self.actor.stop()
+            self.actor.join()
+        self.client.close()
 
 
     def _finished(self): 
@@ -450,10 +307,4 @@ class Node(Thread):
         Condition upon which nodes finish. All nodes must have completed all
         rounds in the critical section.
         """
-        with Node._HAVE_ALL_FINISHED:
-            Node._FINISHED_NODES += 1
-            if Node._FINISHED_NODES == config.numNodes:
-                Node._HAVE_ALL_FINISHED.notify_all()
-
-            while Node._FINISHED_NODES < config.numNodes:
-                Node._HAVE_ALL_FINISHED.wait()
\ No newline at end of file
+        self.finish.wait()
\ No newline at end of file
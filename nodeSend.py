@@ -1,18 +1,132 @@
-from copy import deepcopy
+from collections import deque
+from copy import copy
 from datetime import datetime, timedelta
 from math import ceil, sqrt
-from threading import Event, Thread, Timer
-import utils
+from threading import Condition, Event, Lock, Thread, Timer
+import time
 import config
+import logger_config
+
+
+class SendQueue(Thread):
+    """
+    Outgoing queue of a link, drained by its own writer thread, so that a
+    slow or full peer only delays the messages to that peer. Messages are
+    always accepted, and written in order, since the handlers that send them
+    must not block; once config.send_queue_size of them are pending the link
+    is congested until the writer catches up.
+
+    Attributes:
+        channel (SocketChannel): Link that writes the messages.
+        limit (int): Pending messages at which the link is congested.
+        daemon (bool): Thread's daemon option.
+    """
+    def __init__(self, channel, limit):
+        """
+        Constructor for class SendQueue.
+
+        Args:
+            channel (SocketChannel): Link that writes the messages.
+            limit (int): Pending messages at which the link is congested.
+        """
+        Thread.__init__(self)
+        self.channel = channel
+        self.limit = limit
+        self.daemon = True
+        self.__pending = deque()
+        self.__condition = Condition()
+        self.__closed = False
+
+    def send(self, msg):
+        """
+        Queues a message to be sent through the link.
+
+        Args:
+            msg (Message): Message to be sent.
+        """
+        self.__put((self.channel.send, msg))
+
+    def send_parts(self, parts):
+        """
+        Queues an already encoded message, split in several buffers.
+
+        Args:
+            parts (tuple): Buffers that form the encoded message.
+        """
+        self.__put((self.channel.send_parts, parts))
+
+    def __put(self, item):
+        with self.__condition:
+            self.__pending.append(item)
+            if len(self.__pending) == 1:
+                self.__condition.notify_all()
+
+    def congested(self):
+        """
+        Returns:
+            bool: True if the link has as many messages pending as its limit
+                or more; False otherwise.
+        """
+        return len(self.__pending) >= self.limit
+
+    def wait_ready(self, timeout=None):
+        """
+        Waits until the link is not congested.
+
+        Args:
+            timeout (float, optional): Seconds to wait at most. Defaults to
+                None, to wait as long as needed.
+
+        Returns:
+            bool: True if the link is not congested; False if the time ran
+                out.
+        """
+        with self.__condition:
+            return self.__condition.wait_for(lambda: len(self.__pending) < self.limit, timeout)
+
+    def run(self):
+        """
+        Worker for the objects of this class launched as Threads. Writes the
+        pending messages in order until the queue is closed and empty.
+        """
+        while True:
+            with self.__condition:
+                while not self.__pending and not self.__closed:
+                    self.__condition.wait()
+                if not self.__pending:
+                    break
+                send, data = self.__pending.popleft()
+                if len(self.__pending) == self.limit - 1:
+                    self.__condition.notify_all()
+
+            try:
+                send(data)
+            except OSError as e:
+                print("Exception: ", end="")
+                print(e)
+
+        self.channel.close()
+
+    def close(self):
+        """
+        Closes the link once all the pending messages have been written.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
 
-# DONT MODIFY THIS CLASS
 class NodeSend(Thread):
     """
     Handles a node's operations related to message sending.
 
     Attributes:
         node (Node): Node that sends the messages.
-        client_sockets (list): All nodes' sockets as clients.
+        transport (TcpTransport | InMemoryTransport): Carries the messages.
+        channels (dict): Pool of open links to other nodes, by id. Links
+            that may block are wrapped in a SendQueue if
+            config.send_queue_size is set.
+        elog (BinaryEventLog): Event log of config.event_log, or None.
     """
     def __init__(self, node):
         """
@@ -23,18 +137,90 @@ class NodeSend(Thread):
         """
         Thread.__init__(self)
         self.node = node
-        self.client_sockets = [utils.create_client_socket() for i in range(config.numNodes)]
+        self.transport = node.transport
+        self.channels = {}
+        self.elog = logger_config.get_event_log(config.event_log)
+        self.__channels_lock = Lock()
     
     def build_connection(self):
         """
-        Connects each node client socket to the host and port.
+        Opens a link to each member of the node's quorum and to each node
+        whose requests it arbitrates, through the transport. Links to any
+        other node are opened on demand.
+        """
+        for i in set(self.node.collegues) | set(self.node.quorum_map.arbiter_of(self.node.id)):
+            self.channel(i)
+
+    def channel(self, dest):
+        """
+        Returns the link to a node, opening it if there is none yet.
+
+        Args:
+            dest (int): Destination Node id.
+
+        Returns:
+            SocketChannel | MailboxChannel | SendQueue: Link to the node.
         """
-        for i in range(config.numNodes):
-            self.client_sockets[i].connect(('localhost',config.port+i))
+        channel = self.channels.get(dest)
+        if channel is None:
+            with self.__channels_lock:
+                channel = self.channels.get(dest)
+                if channel is None:
+                    channel = self.transport.connect(self.node.id, dest)
+                    if config.send_queue_size and channel.blocking:
+                        channel = SendQueue(channel, config.send_queue_size)
+                        channel.start()
+                    self.channels[dest] = channel
+        return channel
     
+    def congested(self):
+        """
+        Returns:
+            list: Ids of the nodes whose links are congested.
+        """
+        return [dest for dest, channel in list(self.channels.items())
+                if isinstance(channel, SendQueue) and channel.congested()]
+
+    def wait_ready(self, group, timeout=None):
+        """
+        Waits until none of the links to a group of nodes is congested.
+
+        Args:
+            group (list): IDs of the nodes.
+            timeout (float, optional): Seconds to wait at most. Defaults to
+                None, to wait as long as needed.
+
+        Returns:
+            bool: True if no link to the group is congested; False if the
+                time ran out.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for dest in group:
+            channel = self.channel(dest)
+            if isinstance(channel, SendQueue) and channel.congested():
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if not channel.wait_ready(remaining):
+                    return False
+        return True
+
     def run(self):
         None
 
+    def close(self):
+        """
+        Closes the links to all nodes, waiting for the writer threads of
+        the queued ones to send what is pending.
+        """
+        with self.__channels_lock:
+            channels = list(self.channels.values())
+            self.channels = {}
+
+        for channel in channels:
+            channel.close()
+        for channel in channels:
+            if isinstance(channel, SendQueue):
+                channel.join()
+
     def send_message(self, msg, dest, multicast=False):
         """
         Sends a message to a single destination.
@@ -48,12 +234,17 @@ class NodeSend(Thread):
             self.node.lamport_ts += 1
             msg.set_ts(self.node.lamport_ts)
         assert dest == msg.dest
-        self.client_sockets[dest].sendall(bytes(msg.to_json(),encoding='utf-8'))
+        self.channel(dest).send(msg)
+        self.node.metrics.message_sent(msg.msg_type)
+        if self.elog:
+            self.elog.record(self.elog.SEND, self.node.id, msg)
 
 
     def multicast(self, msg, group):
         """
-        Sends a message to all Nodes within a group.
+        Sends a message to all Nodes within a group. The message is encoded
+        once for the whole group; only its destination is encoded for each
+        Node. Transports that do not serialize get a shallow copy per Node.
 
         Args:
             msg (Message): Message to be sent.
@@ -61,10 +252,20 @@ class NodeSend(Thread):
         """
         self.node.lamport_ts += 1
         msg.set_ts(self.node.lamport_ts)
-        for dest in group:
-            new_msg = deepcopy(msg)
-            new_msg.set_dest(dest)
-            assert new_msg.dest == dest
-            assert new_msg.ts == msg.ts
-            self.send_message(new_msg, dest, True)
 
+        self.node.metrics.message_sent(msg.msg_type, len(group))
+
+        codec = self.transport.codec
+        if codec is None:
+            for dest in group:
+                new_msg = copy(msg)
+                new_msg.set_dest(dest)
+                self.channel(dest).send(new_msg)
+                if self.elog:
+                    self.elog.record(self.elog.SEND, self.node.id, new_msg)
+        else:
+            head, tail = codec.encode_template(msg)
+            for dest in group:
+                self.channel(dest).send_parts((head, codec.encode_dest(dest), tail))
+                if self.elog:
+                    self.elog.record(self.elog.SEND, self.node.id, msg, dest)
@@ -1,9 +1,9 @@
 import select
+import socket
 from threading import Thread
-import utils
-from message import Message, Message_type
-import json
+from recvBuffer import RecvBuffer
 import logger_config
+import config
 
 LOG_FILE_PATH = "logs/log.log"
 
@@ -19,6 +19,9 @@ class NodeServer(Thread):
         daemon (bool): Thread's daemon option.
         connection_list(list): Stores all connections to this node as server.
         server_socket(socket.socket): Socket as server.
+        buffers (dict): Reassembly buffer of each connection.
+        codec (JsonCodec | BinaryCodec): Wire format for the messages.
+        elog (BinaryEventLog): Event log of config.event_log, or None.
     """
     def __init__(self, node):
         """
@@ -30,7 +33,30 @@ class NodeServer(Thread):
         Thread.__init__(self)
         self.node = node
         self.daemon = True
+        self.codec = node.transport.codec
+        self.elog = logger_config.get_event_log(config.event_log)
     
+    def listen(self):
+        """
+        Opens the server socket of a stream transport, so other nodes can
+        connect to it as soon as this method returns.
+        """
+        self.connection_list = []
+        self.buffers = {}
+        self.server_socket = self.node.transport.server_socket(self.node.id)
+        self.connection_list.append(self.server_socket)
+
+    def start(self):
+        """
+        Starts servicing the server socket from the server's own thread,
+        instead of from a shared reactor.
+        """
+        # Written to by stop, to wake up the thread
+        self.__waker, self.__wakeup = socket.socketpair()
+        self.connection_list.append(self.__waker)
+        self.__running = True
+        Thread.start(self)
+
     def run(self):
         """
         Worker for the objects of this class launched as Threads.
@@ -39,15 +65,10 @@ class NodeServer(Thread):
 
     def update(self):
         """
-        Handles the receiving of messages. Parses a stream of bytes to detect
-        separate JSONs, then converts them back into Messages so they can be
-        processed. 
+        Handles the receiving of messages. Decodes a stream of bytes into
+        separate Messages so they can be processed.
         """
-        self.connection_list = []
-        self.server_socket = utils.create_server_socket(self.node.port)
-        self.connection_list.append(self.server_socket)
-
-        while self.node.daemon:
+        while self.__running:
             (read_sockets, write_sockets, error_sockets) = select.select(
                 self.connection_list, [], [], 20)
             if not (read_sockets or write_sockets or error_sockets):
@@ -55,69 +76,97 @@ class NodeServer(Thread):
             else:
                 for read_socket in read_sockets:
                     if read_socket == self.server_socket:
-                        (conn, addr) = read_socket.accept()
-                        self.connection_list.append(conn)
-                    else:
-                        try:
-                            msg_stream, _ = read_socket.recvfrom(4096)
-                            try:
-                                # Extract separate JSONs from the byte stream
-                                # and convert them back to Messages to be processed.
-                                msgs = Message.parse(str(msg_stream, "utf-8"))
-                                for m in msgs:
-                                    self.process_message(Message.from_json(json.loads(m)))
-                            except Exception as e:
-                                print("Exception: ", end="")
-                                print(e)
-                        except:
-                            read_socket.close()
-                            self.connection_list.remove(read_socket)
-                            continue
-        
+                        self.connection_list.append(self.accept())
+                    elif read_socket == self.__waker:
+                        self.__waker.recv(4096)
+                    elif not self.receive(read_socket):
+                        self.connection_list.remove(read_socket)
+                        self.close(read_socket)
+
+        for conn in list(self.buffers):
+            self.close(conn)
         self.server_socket.close()
-        
 
-    def process_message(self, msg):
+    def stop(self):
+        """
+        Stops the thread, which closes the server socket and the
+        connections it accepted, and waits for it to finish.
         """
-        Determines which type of message is received and calls the
-        corresponding handler.
+        # The thread may see the flag and finish before the wake-up is sent
+        self.__running = False
+        self.__wakeup.send(b"\0")
+        self.join()
+        self.__waker.close()
+        self.__wakeup.close()
 
-        Args:
-            msg (Message): Message received.
 
-        Raises:
-            ValueError: If the type of the Message is not valid.
+    def accept(self):
         """
-        clog.info("Node_%i receive msg: %s"%(self.node.id,msg))
-        flog.info("Node_%i receive msg: %s"%(self.node.id,msg))
+        Accepts a pending connection on the server socket and creates its
+        reassembly buffer.
 
-        # Update Lamport timestamp
-        self.node.lamport_ts = max(self.node.lamport_ts, msg.ts) + 1
+        Returns:
+            socket.socket: The new connection.
+        """
+        (conn, addr) = self.server_socket.accept()
+        self.buffers[conn] = RecvBuffer(self.codec)
+        return conn
+
+
+    def close(self, conn):
+        """
+        Closes a connection and discards its reassembly buffer.
 
-        # Received a REQUEST
-        if msg.msg_type == Message_type.REQUEST:
-            self.node.request_handler(msg)
+        Args:
+            conn (socket.socket): Connection to be closed.
+        """
+        conn.close()
+        del self.buffers[conn]
 
-        # Received a YIELD            
-        elif msg.msg_type == Message_type.YIELD:
-            self.node.yield_handler(msg)
 
-        # Received a RELEASE
-        elif msg.msg_type == Message_type.RELEASE:
-            self.node.release_handler(msg)
+    def receive(self, conn):
+        """
+        Reads from a connection and processes all the Messages completed by
+        the bytes received. Partial Messages are kept in the connection's
+        buffer until the rest of their bytes arrive.
+
+        Args:
+            conn (socket.socket): Connection ready to be read.
 
-        # Received INQUIRE
-        elif msg.msg_type == Message_type.INQUIRE:
-            self.node.inquire_handler(msg)
+        Returns:
+            bool: False if the connection must be closed; True otherwise.
+        """
+        buffer = self.buffers[conn]
+        try:
+            if not buffer.recv_from(conn):
+                return False
+            msgs = buffer.messages()
+        except (OSError, ValueError) as e:
+            print("Exception: ", end="")
+            print(e)
+            return False
+
+        for m in msgs:
+            try:
+                self.process_message(m)
+            except Exception as e:
+                print("Exception: ", end="")
+                print(e)
+
+        return True
+        
 
-        # Received a GRANT
-        elif msg.msg_type == Message_type.GRANT:
-            self.node.grant_handler(msg)
+    def process_message(self, msg):
+        """
+        Logs a received message and posts it to the node's actor, which runs
+        the handlers.
 
-        # Received a FAILED
-        elif msg.msg_type == Message_type.FAILED:
-            self.node.failed_handler(msg)
+        Args:
+            msg (Message): Message received.
+        """
+        clog.info("Node_%i receive msg: %s", self.node.id, msg)
+        flog.info("Node_%i receive msg: %s", self.node.id, msg)
+        if self.elog:
+            self.elog.record(self.elog.RECEIVE, self.node.id, msg)
 
-        # Received a message with a non valid type
-        else:
-            raise ValueError(f"[ValueError]: Unknown message type: {msg.msg_type}")
\ No newline at end of file
+        self.node.actor.post(self.node.handle, msg)
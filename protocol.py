@@ -0,0 +1,874 @@
+from itertools import count
+import time
+from indexedHeap import IndexedHeap
+from message import Message, Message_type
+import logger_config
+import metrics
+
+LOG_FILE_PATH = "logs/log.log"
+
+flog = logger_config.get_file_logger(LOG_FILE_PATH, logger_config.logging.DEBUG)
+clog = logger_config.get_console_logger(logger_config.logging.INFO)
+
+class LockState(object):
+    """
+    State of Maekawa's algorithm for one named lock at one node, both as a
+    requester and as an arbiter. Locks are independent of each other.
+
+    Requests are either exclusive or shared. An arbiter grants any number
+    of shared requests at once, but an exclusive request only when no other
+    GRANT is out.
+
+    Attributes:
+        key (str): Name of the lock; None for the default lock.
+        queue (IndexedHeap): Stores other nodes' requests based on priority,
+            as (ts, src, seq, shared).
+        grants_sent (dict): Requests, as (ts, src, seq, shared), to which a
+            GRANT is sent, by src. Either a single exclusive request or any
+            number of shared ones.
+        inquired (dict): Nodes holding a GRANT that have been sent an
+            INQUIRE for it, by ID: True if it preempted them; False if it
+            only recalled a sticky GRANT.
+        next_sent (tuple): Holder and queue head, as (src, (ts, src, seq)),
+            of the last NEXT sent, with grant forwarding.
+        next (dict): Request next in line at each arbiter whose GRANT the
+            node holds, as (ts, src, seq), by arbiter ID, with grant
+            forwarding.
+        pending_inquires (dict): Arbiters that sent an INQUIRE for a
+            forwarded GRANT that has not arrived yet, by ID: True if it only
+            recalls the GRANT.
+        grants_received (set): IDs of the nodes that have conceded a GRANT
+            to the current request.
+        requesting (bool): True while waiting for the GRANTs; False otherwise.
+        shared (bool): True if the current request is shared; False if it is
+            exclusive.
+        lease (bool): With sticky grants, mode of the GRANTs kept after
+            leaving the critical section: True if shared, False if
+            exclusive, or None if none are kept.
+        recalled (set): IDs of the arbiters that want their sticky GRANT
+            back when the node leaves the critical section.
+        request_seq (int): Sequence number of the node's last request for
+            the lock. GRANTs and FAILEDs carry it, so replies to cancelled
+            requests are told apart.
+        rejected (bool): True if some arbiter has reported a higher priority
+            request since the current request was sent; False otherwise.
+        yielded (bool): True if the node has already yielded; False otherwise.
+        failed (bool): True if the node has received a FAILED; False otherwise.
+        in_CS (bool): True if the node is in the critical section; False otherwise.
+        arrival_time (float): Time the demand of the current request
+            arrived, maybe before the request was sent.
+        request_time (float): Time the current request was sent.
+        enter_time (float): Time the node entered the critical section.
+    """
+    def __init__(self, key):
+        """
+        Constructor for class LockState.
+
+        Args:
+            key (str): Name of the lock; None for the default lock.
+        """
+        self.key = key
+        self.queue = IndexedHeap()
+        self.grants_sent = {}
+        self.inquired = {}
+        self.next_sent = None
+        self.next = {}
+        self.pending_inquires = {}
+        self.grants_received = set()
+        self.requesting = False
+        self.shared = False
+        self.lease = None
+        self.recalled = set()
+        self.request_seq = 0
+        self.rejected = False
+        self.yielded = False
+        self.failed = False
+        self.in_CS = False
+        self.arrival_time = None
+        self.request_time = None
+        self.enter_time = None
+
+
+class MaekawaProtocol(object):
+    """
+    State machine of Maekawa's algorithm, shared by every node runtime. A
+    runtime mixes this class in and provides the attributes below, plus a
+    client with send_message and multicast methods. The handlers take no
+    locks: the runtime must call them, and the methods that request and
+    release the critical section, from a single thread or event loop.
+
+    Every message carries the key of the lock it is about, and the node
+    keeps a separate LockState per key, so any number of locks share the
+    same connections and threads. The state of a key is created when the
+    key is used and dropped once idle, so keys used only for a while take
+    no memory afterwards.
+
+    With grant forwarding, an arbiter that has sent an exclusive GRANT tells
+    the holder which request is next in line with a NEXT. On leaving the
+    critical section the holder sends those requests the GRANTs itself, in
+    a FORWARD, and the RELEASE tells each arbiter where its GRANT went. The
+    next node then waits one message delay instead of two. An arbiter only
+    accepts a forward to a request it still has queued; otherwise it serves
+    its queue as usual, and the FORWARD is ignored as stale by its target.
+
+    With sticky grants, a node leaving the critical section keeps the
+    GRANTs of the arbiters with nobody waiting, and enters again without a
+    message while it holds all of them. An arbiter that gets a request it
+    cannot grant recalls the GRANTs with an INQUIRE, which the node answers
+    with a RELEASE once it is out of the critical section.
+
+    Attributes:
+        id (int): Numerical identifier of the Node.
+        lamport_ts (int): Lamport timestamp of the last message sent.
+        client (NodeSend): Client for handling message sending.
+        quorum_map (QuorumMap): Quora of all the nodes of the system.
+        collegues (tuple): Colleagues in the Node's quorum.
+        locks (dict): LockState of each lock in use, by key.
+        metrics (NodeMetrics): Counters and latencies of the node.
+        forwarding (bool): True if GRANTs are forwarded on release; False
+            otherwise.
+        sticky (bool): True if GRANTs are kept after release until
+            recalled; False otherwise.
+    """
+    def _init_protocol(self, quorum_map, forwarding=False, sticky=False):
+        """
+        Initializes the protocol state of the node. The id must already be
+        set.
+
+        Args:
+            quorum_map (QuorumMap): Quora of all the nodes of the system.
+            forwarding (bool, optional): True to forward GRANTs on release.
+                Defaults to False.
+            sticky (bool, optional): True to keep GRANTs after release until
+                recalled. Defaults to False.
+        """
+        self.forwarding = forwarding
+        self.sticky = sticky
+        self.lamport_ts = 0
+        self.quorum_map = quorum_map
+        self.collegues = quorum_map.quorum(self.id)
+        self.locks = {}
+        self.metrics = metrics.NodeMetrics(self.id, self._clock)
+        self.__request_seqs = count(1)
+        self.__queued = 0
+
+
+    def lock_state(self, key=None):
+        """
+        Returns the state of a lock, creating it if it has none, because it
+        is used for the first time or was idle.
+
+        Args:
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+
+        Returns:
+            LockState: State of the lock.
+        """
+        state = self.locks.get(key)
+        if state is None:
+            state = LockState(key)
+            self.locks[key] = state
+        return state
+
+
+    def __drop_if_idle(self, state):
+        """
+        Drops the state of a lock that holds nothing: no requests queued or
+        GRANTs sent as arbiter, and no request, GRANTs or lease of its own.
+        Whatever else it keeps only matters during a request, so a new
+        state is as good. Late replies to a previous request are ignored
+        by their sequence number either way.
+
+        Args:
+            state (LockState): State of the lock.
+        """
+        if (state.queue.empty() and not state.grants_sent and not state.grants_received
+                and not state.requesting and not state.in_CS and state.lease is None
+                and self.locks.get(state.key) is state):
+            del self.locks[state.key]
+
+
+    def _clock(self):
+        """
+        Returns:
+            float: Current time of the runtime, in seconds. Monotonic time by
+                default.
+        """
+        return time.monotonic()
+
+
+    def __log_sent(self, msg, state):
+        """
+        Logs a message sent by a handler, followed by the queue once the
+        message has been handled. The queue is only formatted if some logger
+        is at DEBUG level.
+
+        Args:
+            msg (Message): Message sent.
+            state (LockState): State of the message's lock.
+        """
+        flog.debug("Node_%i send msg: %s", self.id, msg)
+        clog.debug("Node_%i send msg: %s", self.id, msg)
+
+        if flog.isEnabledFor(logger_config.logging.DEBUG) or clog.isEnabledFor(logger_config.logging.DEBUG):
+            queue = self.__queue_tostr(state)
+            flog.debug(queue)
+            clog.debug(queue)
+
+
+    def __queue_tostr(self, state):
+        """
+        Converts the contents of the queue to a formatted string, preserving
+        the order.
+
+        Args:
+            state (LockState): State of the lock whose queue is converted.
+
+        Returns:
+            string: formatted string representation of the queue contents
+        """
+        return f"\t\tts_{self.lamport_ts}: Queue of Node_{self.id}[{state.key}]: {state.queue.snapshot()}"
+
+
+    def request_handler(self, msg, state):
+        """
+        Handler for REQUEST type messages. The request is queued and the
+        queue is served: it is granted at once if it is compatible with the
+        GRANTs sent and no higher priority request is waiting. Otherwise:
+
+            - Some GRANT went to a higher priority node, or the request
+                waits behind a higher priority one -> send FAILED to
+                requester
+            - All the conflicting GRANTs went to lower priority nodes ->
+                they get an INQUIRE
+
+        A node still holding a sticky GRANT gives it up with its new
+        request.
+
+        Args:
+            msg (Message): the Message containing the REQUEST, whose data is
+                (seq, shared)
+            state (LockState): State of the message's lock.
+        """
+        seq, shared = msg.data
+        if state.grants_sent.pop(msg.src, None) is not None:
+            state.inquired.pop(msg.src, None)
+            state.next_sent = None
+
+        state.queue.put((msg.ts, msg.src, seq, shared))
+        self.__serve_queue(state)
+
+        if msg.src in state.grants_sent:
+            return
+
+        # Reply with a FAILED if a higher priority node goes first
+        hp_ts, hp_src = min(min(state.grants_sent.values()), state.queue.peek())[:2]
+        if (hp_ts, hp_src) < (msg.ts, msg.src):
+            rep = Message(
+                    Message_type.FAILED,
+                    self.id,
+                    msg.src,
+                    self.lamport_ts,
+                    seq,
+                    state.key
+                )
+
+            self.client.send_message(rep, msg.src)
+            self.__log_sent(rep, state)
+
+
+
+    def yield_handler(self, msg, state):
+        """
+        Handler for YIELD type messages. Puts the yielding node in the queue,
+        removes the grant previously sent to it and serves the queue.
+
+        Args:
+            msg (Message): Message containing the YIELD
+            state (LockState): State of the message's lock.
+        """
+
+        # Ignore a YIELD from a node that no longer holds the GRANT
+        request = state.grants_sent.pop(msg.src, None)
+        if request is None:
+            return
+        state.inquired.pop(msg.src, None)
+        state.next_sent = None
+
+        # Put the yielding node back in the queue, with its request's
+        # priority
+        state.queue.put(request)
+        self.__serve_queue(state)
+
+
+    def release_handler(self, msg, state):
+        """
+        Handler for RELEASE type messages. Removes the releasing node from both
+        the queue and the list of grants sent, and then serves the queue.
+
+        Args:
+            msg (Message): message containing the RELEASE
+            state (LockState): State of the message's lock.
+        """
+
+        # Remove the releasing node from the queue and free its GRANT
+        state.queue.remove(msg.src)
+        request = state.grants_sent.pop(msg.src, None)
+        state.inquired.pop(msg.src, None)
+        if request is not None:
+            state.next_sent = None
+
+        # Take over a forward of an exclusive GRANT, if its target is still
+        # waiting for the same request
+        if request is not None and not request[3] and msg.data:
+            for arbiter, target, seq in msg.data:
+                if arbiter != self.id:
+                    continue
+                queued = state.queue.remove(target)
+                if queued is not None and queued[2] == seq:
+                    state.grants_sent[target] = queued
+                elif queued is not None:
+                    state.queue.put(queued)
+
+        self.__serve_queue(state)
+
+
+    def __compatible(self, state, shared):
+        """
+        Checks whether a request can be granted along with the GRANTs sent.
+        Shared GRANTs only coexist with each other, so looking at any of
+        them is enough.
+
+        Args:
+            state (LockState): State of the lock.
+            shared (bool): True for a shared request; False for an exclusive
+                one.
+
+        Returns:
+            bool: True if the request does not conflict; False otherwise.
+        """
+        if not state.grants_sent:
+            return True
+        return shared and next(iter(state.grants_sent.values()))[3]
+
+
+    def __serve_queue(self, state):
+        """
+        Sends a GRANT to the requests at the head of the queue, in priority
+        order, until one conflicts with the GRANTs sent. Consecutive shared
+        requests are granted together. If the request left at the head has
+        more priority than all the GRANTs it conflicts with, their holders
+        get an INQUIRE, once per GRANT.
+
+        Args:
+            state (LockState): State of the lock.
+        """
+        while not state.queue.empty():
+            if not self.__compatible(state, state.queue.peek()[3]):
+                break
+
+            request = state.queue.get()
+            q_src, q_seq = request[1], request[2]
+            rep = Message(
+                    Message_type.GRANT,
+                    self.id,
+                    q_src,
+                    self.lamport_ts,
+                    q_seq,
+                    state.key
+                )
+
+            self.client.send_message(rep, q_src)
+            state.grants_sent[q_src] = request
+
+            self.__log_sent(rep, state)
+            if flog.isEnabledFor(logger_config.logging.DEBUG) or clog.isEnabledFor(logger_config.logging.DEBUG):
+                grants = list(state.grants_sent.values())
+                flog.debug("\t\tGRANTS Node_%i: %s", self.id, grants)
+                clog.debug("\t\tGRANTS Node_%i: %s", self.id, grants)
+
+        if state.queue.empty():
+            return
+
+        # Tell the holder of an exclusive GRANT which request goes next
+        head = state.queue.peek()
+        if self.forwarding and len(state.grants_sent) == 1:
+            g_src, g_shared = next(iter(state.grants_sent.values()))[1::2]
+            if not g_shared and state.next_sent != (g_src, head):
+                rep = Message(
+                        Message_type.NEXT,
+                        self.id,
+                        g_src,
+                        self.lamport_ts,
+                        head[:3],
+                        state.key
+                    )
+
+                self.client.send_message(rep, g_src)
+                state.next_sent = (g_src, head)
+                self.__log_sent(rep, state)
+
+        # The head conflicts with every GRANT sent. Preempt them if none
+        # went to a higher priority node; otherwise wait, but recall them
+        # if they may be sticky.
+        hp_ts, hp_src = head[:2]
+        preempt = not min(state.grants_sent.values())[:2] < (hp_ts, hp_src)
+        if not preempt and not self.sticky:
+            return
+
+        for g_src in state.grants_sent:
+            if g_src in state.inquired and (state.inquired[g_src] or not preempt):
+                continue
+
+            rep = Message(
+                    Message_type.INQUIRE,
+                    self.id,
+                    g_src,
+                    self.lamport_ts,
+                    (hp_ts, hp_src, state.grants_sent[g_src][2], not preempt),
+                    state.key
+                )
+
+            self.client.send_message(rep, g_src)
+            state.inquired[g_src] = preempt
+            self.__log_sent(rep, state)
+
+
+    def inquire_handler(self, msg, state):
+        """
+        Handler for INQUIRE type messages. If the node hasn't yet gotten into
+        the critical section, replies with a YIELD message. A recall of a
+        sticky GRANT is answered with a RELEASE once the node is out of the
+        critical section.
+
+        Args:
+            msg (Message): message containing the INQUIRE, whose data is
+                (ts, src) of the inquiring request, the seq of the GRANT and
+                whether it is only a recall
+            state (LockState): State of the message's lock.
+        """
+        reps = []
+        recall = msg.data[3]
+
+        # If it holds the GRANT but hasn't got the CS, yield. An INQUIRE
+        # crossing a RELEASE or a previous YIELD gets no reply, and so does
+        # one about a previous request.
+        if msg.data[2] != state.request_seq:
+            return
+
+        if msg.src in state.grants_received:
+            if state.in_CS or (state.requesting and recall):
+                if self.sticky:
+                    state.recalled.add(msg.src)
+            elif not state.requesting:
+                reps = self.__release_kept(state, [msg.src])
+            else:
+                reps = self.__yield(state, [msg.src])
+
+        # The GRANT is still on its way, forwarded by the previous holder
+        elif state.requesting:
+            state.pending_inquires[msg.src] = recall
+
+        # Send yield or release messages if created
+        for rep in reps:
+            self.client.send_message(rep, rep.dest)
+            self.__log_sent(rep, state)
+
+
+    def __yield(self, state, arbiters):
+        """
+        Gives back GRANTs held by the node. The YIELDs are sent by the
+        caller.
+
+        Args:
+            state (LockState): State of the lock.
+            arbiters (iterable): IDs of the arbiters of the GRANTs.
+
+        Returns:
+            list: The YIELD messages.
+        """
+        reps = []
+        for arbiter in arbiters:
+            reps.append(Message(
+                    Message_type.YIELD,
+                    self.id,
+                    arbiter,
+                    self.lamport_ts,
+                    key=state.key
+                ))
+
+            # Clear the yielding node from the grants received
+            state.grants_received.remove(arbiter)
+            state.next.pop(arbiter, None)
+            state.recalled.discard(arbiter)
+
+        state.yielded = True
+        state.rejected = True
+        self._rejected(state)
+        return reps
+
+
+    def __release_kept(self, state, arbiters):
+        """
+        Gives back sticky GRANTs kept out of the critical section. The
+        RELEASEs are sent by the caller.
+
+        Args:
+            state (LockState): State of the lock.
+            arbiters (iterable): IDs of the arbiters of the GRANTs.
+
+        Returns:
+            list: The RELEASE messages.
+        """
+        reps = []
+        for arbiter in arbiters:
+            reps.append(Message(
+                    Message_type.RELEASE,
+                    self.id,
+                    arbiter,
+                    self.lamport_ts,
+                    key=state.key
+                ))
+            state.grants_received.remove(arbiter)
+
+        if not state.grants_received:
+            state.lease = None
+        return reps
+
+
+    def grant_handler(self, msg, state):
+        """
+        Handler for GRANT type messages. Adds the GRANT to its own list and
+        clears failed and yielded conditions. Notifies if it has gotten all
+        the grants from peers. A GRANT for a cancelled request is ignored:
+        the RELEASE sent on cancelling frees it at the arbiter.
+
+        Args:
+            msg (Message): message containing the GRANT
+            state (LockState): State of the message's lock.
+        """
+        if not state.requesting or msg.data != state.request_seq:
+            return
+
+        state.grants_received.add(msg.src)
+        state.yielded = False
+        state.failed = False
+
+        if not len(state.grants_received) < len(self.collegues):
+            self._all_granted(state)
+
+
+    def failed_handler(self, msg, state):
+        """
+        Handler for FAILED type messages. Sets the failed and yielded
+        conditions.
+
+        Args:
+            msg (Message): message containing the FAILED
+            state (LockState): State of the message's lock.
+        """
+        if not state.requesting or msg.data != state.request_seq:
+            return
+
+        state.failed = True
+        state.yielded = True
+        state.rejected = True
+        self._rejected(state)
+
+
+    def next_handler(self, msg, state):
+        """
+        Handler for NEXT type messages. Keeps the request that goes next at
+        the arbiter, to forward it the GRANT on release.
+
+        Args:
+            msg (Message): message containing the NEXT, whose data is the
+                request as (ts, src, seq)
+            state (LockState): State of the message's lock.
+        """
+        state.next[msg.src] = tuple(msg.data)
+
+
+    def forward_handler(self, msg, state):
+        """
+        Handler for FORWARD type messages. Counts the GRANTs forwarded by
+        the previous holder as if they came from their arbiters, and yields
+        at once those already inquired.
+
+        Args:
+            msg (Message): message containing the FORWARD, whose data is
+                (seq, arbiters)
+            state (LockState): State of the message's lock.
+        """
+        seq, arbiters = msg.data
+        reps = []
+
+        if not state.requesting or seq != state.request_seq:
+            return
+
+        state.grants_received.update(arbiters)
+        state.yielded = False
+        state.failed = False
+
+        inquired = [a for a in arbiters if a in state.pending_inquires]
+        for arbiter in inquired:
+            if state.pending_inquires.pop(arbiter) and self.sticky:
+                state.recalled.add(arbiter)
+
+        inquired = [a for a in inquired if a not in state.recalled]
+        if inquired:
+            reps = self.__yield(state, inquired)
+        elif not len(state.grants_received) < len(self.collegues):
+            self._all_granted(state)
+
+        for rep in reps:
+            self.client.send_message(rep, rep.dest)
+            self.__log_sent(rep, state)
+
+
+    def _all_granted(self, state):
+        """
+        Called when the node has gotten the GRANTs of all its quorum. The
+        runtime overrides it to wake up whoever waits to enter the CS.
+
+        Args:
+            state (LockState): State of the granted lock.
+        """
+        None
+
+
+    def _rejected(self, state):
+        """
+        Called when an arbiter reports a higher priority request. The
+        runtime may override it to give up the request.
+
+        Args:
+            state (LockState): State of the rejected lock.
+        """
+        None
+
+
+    def handle(self, msg):
+        """
+        Determines which type of message is received and calls the
+        corresponding handler with the state of the message's lock.
+
+        Args:
+            msg (Message): Message received.
+
+        Raises:
+            ValueError: If the type of the Message is not valid.
+        """
+        # Update Lamport timestamp
+        self.lamport_ts = max(self.lamport_ts, msg.ts) + 1
+        self.metrics.message_received(msg.msg_type)
+
+        state = self.lock_state(msg.key)
+        queued = len(state.queue)
+
+        # Received a REQUEST
+        if msg.msg_type == Message_type.REQUEST:
+            self.request_handler(msg, state)
+
+        # Received a YIELD
+        elif msg.msg_type == Message_type.YIELD:
+            self.yield_handler(msg, state)
+
+        # Received a RELEASE
+        elif msg.msg_type == Message_type.RELEASE:
+            self.release_handler(msg, state)
+
+        # Received INQUIRE
+        elif msg.msg_type == Message_type.INQUIRE:
+            self.inquire_handler(msg, state)
+
+        # Received a GRANT
+        elif msg.msg_type == Message_type.GRANT:
+            self.grant_handler(msg, state)
+
+        # Received a FAILED
+        elif msg.msg_type == Message_type.FAILED:
+            self.failed_handler(msg, state)
+
+        # Received a NEXT
+        elif msg.msg_type == Message_type.NEXT:
+            self.next_handler(msg, state)
+
+        # Received a FORWARD
+        elif msg.msg_type == Message_type.FORWARD:
+            self.forward_handler(msg, state)
+
+        # Received a message with a non valid type
+        else:
+            raise ValueError(f"[ValueError]: Unknown message type: {msg.msg_type}")
+
+        # Requests queued for all the locks
+        self.__queued += len(state.queue) - queued
+        self.metrics.set_queue_depth(self.__queued)
+        self.__drop_if_idle(state)
+
+
+    def request_cs(self, arrival_time=None, key=None, shared=False):
+        """
+        Asks all quorum members for permission to enter the critical section.
+        The node is a member of its own quorum and arbitrates its own request
+        like any other. With sticky grants, if the node still holds all the
+        GRANTs of its previous request, in the same mode, it is granted
+        again without sending anything.
+
+        Args:
+            arrival_time (float, optional): Time the demand arrived, if it
+                had to wait for earlier ones. Latencies are measured from it.
+                Defaults to now.
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+            shared (bool, optional): True to share the section with other
+                shared requests; False for exclusive access. Defaults to
+                False.
+
+        Returns:
+            LockState: State of the requested lock.
+        """
+        state = self.lock_state(key)
+
+        state.request_time = self._clock()
+        state.arrival_time = state.request_time if arrival_time is None else arrival_time
+        state.requesting = True
+        state.rejected = False
+
+        # Reuse the request the arbiters still hold the GRANTs for
+        if state.lease == shared and len(state.grants_received) == len(self.collegues):
+            state.lease = None
+            self._all_granted(state)
+            return state
+
+        state.request_seq = next(self.__request_seqs)
+        state.shared = shared
+        state.lease = None
+        state.grants_received.clear()
+        state.next.clear()
+        state.pending_inquires.clear()
+        state.recalled.clear()
+
+        req = Message(
+                msg_type=Message_type.REQUEST,
+                src=self.id,
+                ts=self.lamport_ts,
+                data=(state.request_seq, shared),
+                key=key
+            )
+
+        self.client.multicast(req, self.collegues)
+
+        flog.debug("Node_%i send msg: %s", self.id, req)
+        clog.debug("Node_%i send msg: %s", self.id, req)
+        return state
+
+
+    def _enter_cs(self, state):
+        """
+        Called once the node has gotten the GRANTs of all its quorum. Marks
+        it as in the critical section.
+
+        Args:
+            state (LockState): State of the granted lock.
+        """
+        state.in_CS = True
+        state.requesting = False
+        state.enter_time = self._clock()
+        self.metrics.observe_grant_wait(state.enter_time - state.request_time)
+
+
+    def release_cs(self, key=None):
+        """
+        Leaves the critical section and notifies all quorum members. With
+        grant forwarding, the requests next in line at the arbiters get
+        their GRANTs from this node first. With sticky grants, only the
+        arbiters that recalled their GRANT are notified, and the rest are
+        kept.
+
+        Args:
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+        """
+        state = self.lock_state(key)
+
+        state.in_CS = False
+        if self.sticky:
+            group = [arbiter for arbiter in self.collegues if arbiter in state.recalled]
+            state.grants_received.difference_update(group)
+            state.lease = state.shared if state.grants_received else None
+        else:
+            group = self.collegues
+            state.grants_received.clear()
+        state.recalled.clear()
+        nexts = {arbiter: state.next[arbiter] for arbiter in group if arbiter in state.next}
+        state.next = {}
+        self.metrics.record_cs(state.arrival_time, state.enter_time, self._clock())
+        self.__drop_if_idle(state)
+
+        if not group:
+            return
+
+        # Group the forwarded GRANTs by request
+        forwards = {}
+        for arbiter, (_, target, seq) in nexts.items():
+            forwards.setdefault((target, seq), []).append(arbiter)
+
+        for (target, seq), arbiters in forwards.items():
+            fwd = Message(
+                    Message_type.FORWARD,
+                    self.id,
+                    target,
+                    self.lamport_ts,
+                    (seq, arbiters),
+                    key
+                )
+
+            self.client.send_message(fwd, target)
+            flog.debug("Node_%i send msg: %s", self.id, fwd)
+            clog.debug("Node_%i send msg: %s", self.id, fwd)
+
+        rel = Message(
+                msg_type=Message_type.RELEASE,
+                src=self.id,
+                ts=self.lamport_ts,
+                data=[(arbiter, target, seq) for (target, seq), arbiters in forwards.items()
+                      for arbiter in arbiters] or None,
+                key=key
+            )
+
+        self.client.multicast(rel, group)
+        flog.debug("Node_%i send msg: %s", self.id, rel)
+        clog.debug("Node_%i send msg: %s", self.id, rel)
+
+
+    def cancel_cs(self, key=None):
+        """
+        Gives up a request that has not got all the GRANTs. The RELEASE
+        removes it from the arbiters' queues and frees the GRANTs already
+        given, or in flight, to it.
+
+        Args:
+            key (str, optional): Name of the lock. Defaults to None, for the
+                default lock.
+        """
+        state = self.lock_state(key)
+
+        state.requesting = False
+        state.grants_received.clear()
+        state.recalled.clear()
+        self.__drop_if_idle(state)
+
+        rel = Message(
+                msg_type=Message_type.RELEASE,
+                src=self.id,
+                ts=self.lamport_ts,
+                key=key
+            )
+
+        self.client.multicast(rel, self.collegues)
+        self.metrics.request_cancelled()
+        flog.debug("Node_%i send msg: %s", self.id, rel)
+        clog.debug("Node_%i send msg: %s", self.id, rel)
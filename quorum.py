@@ -0,0 +1,494 @@
+from functools import lru_cache
+from math import ceil, sqrt
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+import config
+
+
+def grid_quorums(n):
+    """
+    Forms the quora of a grid. If all nodes are displayed in a square
+    matrix, row-major ordered by node id, the quorum of a node is formed by
+    those on the same row or on the same column. Quora have about 2*sqrt(n)
+    members; if the last row is not full, some of them have fewer.
+
+    Args:
+        n (int): Number of nodes.
+
+    Returns:
+        list: Quorum of each node, as a list of ids that includes the node.
+    """
+    # The dimension of the matrix rounded up from the square root of the
+    # number of nodes.
+    num_rows = ceil(sqrt(n))
+
+    quorums = []
+    for i in range(n):
+        row_start = i - i % num_rows
+        row = [j for j in range(row_start, min(row_start + num_rows, n)) if j != i]
+        col = list(range(i % num_rows, n, num_rows))
+        quorums.append(row + col)
+
+    return quorums
+
+
+class GaloisField(object):
+    """
+    Finite field GF(q), with q = p^k for a prime p. Elements are the ints
+    0..q-1, whose base p digits are the coefficients of a polynomial over
+    GF(p) of degree below k. Operations are precomputed in tables.
+
+    Attributes:
+        q (int): Order of the field.
+        add (list): Sum of each pair of elements.
+        mul (list): Product of each pair of elements.
+        neg (list): Opposite of each element.
+        inv (list): Inverse of each element, None for 0.
+    """
+    def __init__(self, p, k):
+        """
+        Constructor for class GaloisField.
+
+        Args:
+            p (int): Characteristic of the field, a prime.
+            k (int): Degree of the extension.
+        """
+        self.q = q = p ** k
+        modulus = _irreducible_polynomial(p, k)
+
+        digits = [_to_digits(a, p, k) for a in range(q)]
+        self.add = [[_from_digits([(x + y) % p for x, y in zip(digits[a], digits[b])], p)
+                     for b in range(q)] for a in range(q)]
+        self.mul = [[_from_digits(_poly_mod(_poly_mul(digits[a], digits[b], p), modulus, p)[:k], p)
+                     for b in range(q)] for a in range(q)]
+        self.neg = [self.add[a].index(0) for a in range(q)]
+        self.inv = [None] + [self.mul[a].index(1) for a in range(1, q)]
+
+
+def _to_digits(a, p, k):
+    return [(a // p ** i) % p for i in range(k)]
+
+
+def _from_digits(digits, p):
+    return sum(d * p ** i for i, d in enumerate(digits))
+
+
+def _poly_mul(a, b, p):
+    prod = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            prod[i + j] = (prod[i + j] + x * y) % p
+    return prod
+
+
+def _poly_mod(a, modulus, p):
+    """
+    Remainder of a polynomial divided by a monic one, both given by their
+    coefficients from the lowest degree. The result has len(modulus) - 1
+    coefficients.
+    """
+    a = list(a) + [0] * max(0, len(modulus) - 1 - len(a))
+    deg = len(modulus) - 1
+    for i in range(len(a) - 1, deg - 1, -1):
+        coef = a[i]
+        if coef:
+            for j in range(deg + 1):
+                a[i - deg + j] = (a[i - deg + j] - coef * modulus[j]) % p
+    return a[:deg]
+
+
+def _irreducible_polynomial(p, k):
+    """
+    Finds a monic irreducible polynomial of degree k over GF(p).
+
+    Returns:
+        list: Coefficients of the polynomial, from the lowest degree.
+    """
+    if k == 1:
+        return [0, 1]
+
+    def monic(degree):
+        for a in range(p ** degree):
+            yield _to_digits(a, p, degree) + [1]
+
+    for candidate in monic(k):
+        if all(any(_poly_mod(candidate, divisor, p))
+               for degree in range(1, k // 2 + 1) for divisor in monic(degree)):
+            return candidate
+
+
+def _prime_power(q):
+    """
+    Decomposes q as p^k for a prime p.
+
+    Returns:
+        tuple: (p, k), or None if q is not a prime power.
+    """
+    p = next(d for d in range(2, q + 1) if q % d == 0)
+    k = 0
+    while q % p == 0:
+        q //= p
+        k += 1
+    return (p, k) if q == 1 else None
+
+
+def projective_plane(q):
+    """
+    Lines of the projective plane PG(2, q), for a prime power q, built as a
+    cyclic (Singer) plane. It has P = q^2 + q + 1 points and as many lines;
+    each line has q + 1 points and any two lines meet at exactly one point.
+    GF(q^3) is built as GF(q)[x] modulo a cubic for which x generates its
+    nonzero elements up to GF(q) factors, so point i is x^i. The points
+    whose x^2 coefficient is 0, a plane of GF(q^3) over GF(q), form a
+    difference set D, and line i is D + i modulo P. D is shifted so that
+    it holds 0, and line i goes through point i.
+
+    Args:
+        q (int): Order of the plane, a prime power.
+
+    Returns:
+        list: Points on each line, in increasing order.
+    """
+    field = GaloisField(*_prime_power(q))
+    add, mul, neg = field.add, field.mul, field.neg
+    size = q * q + q + 1
+
+    for c0 in range(1, q):
+        for c1 in range(q):
+            for c2 in range(q):
+                # Irreducible: t^3 + c2*t^2 + c1*t + c0 has no roots
+                if any(add[add[mul[mul[t][t]][add[t][c2]]][mul[c1][t]]][c0] == 0 for t in range(q)):
+                    continue
+
+                # Powers of x, multiplying by x with x^3 = -(c0 + c1*x + c2*x^2)
+                a0, a1, a2 = 1, 0, 0
+                zeros = []
+                for i in range(size):
+                    if i and not a1 and not a2:
+                        break
+                    if not a2:
+                        zeros.append(i)
+                    a0, a1, a2 = neg[mul[a2][c0]], add[a0][neg[mul[a2][c1]]], add[a1][neg[mul[a2][c2]]]
+                else:
+                    # x^size must be in GF(q) for x to generate the plane
+                    if a1 or a2:
+                        continue
+                    base = zeros[0]
+                    difference_set = [(d - base) % size for d in zeros]
+                    return [sorted((d + i) % size for d in difference_set) for i in range(size)]
+
+
+def projective_quorums(n):
+    """
+    Forms Maekawa's optimal quora from the lines of a finite projective
+    plane, so that they have about sqrt(n) members and any two of them meet.
+    When n is not q^2 + q + 1 for a prime power q, the largest plane with at
+    most n points is padded with the extra nodes; below the smallest plane,
+    its spare points are mapped onto real nodes. Either way each node
+    arbitrates for about as many quora as any other.
+
+    Args:
+        n (int): Number of nodes.
+
+    Returns:
+        list: Quorum of each node, as a sorted list of ids that includes the
+            node.
+    """
+    q = 2
+    while True:
+        order = q + 1
+        while _prime_power(order) is None:
+            order += 1
+        if order * order + order + 1 > n:
+            break
+        q = order
+    lines = projective_plane(q)
+
+    if n < len(lines):
+        quorums = _fold_spare_points(n, lines)
+    else:
+        quorums = _pad_extra_nodes(n, lines)
+
+    return [sorted(members) for members in quorums]
+
+
+def _fold_spare_points(n, lines):
+    """
+    Forms the quora of fewer nodes than points: each node gets the line
+    through its own point, and each spare point is mapped onto the node
+    left least loaded by it. A point is mapped onto the same node in every
+    line, so the quora still meet.
+
+    Returns:
+        list: Quorum of each node, as a set of ids.
+    """
+    quorums = [set(p for p in lines[i] if p < n) for i in range(n)]
+    load = [0] * n
+    for members in quorums:
+        for j in members:
+            load[j] += 1
+
+    owners = {}
+    for i in range(n):
+        for p in lines[i]:
+            if p >= n:
+                owners.setdefault(p, []).append(i)
+
+    # Busiest spare points first, as in longest processing time scheduling
+    for p in sorted(owners, key=lambda p: (-len(owners[p]), p)):
+        gain = lambda j: sum(1 for i in owners[p] if j not in quorums[i])
+        node = min(range(n), key=lambda j: (load[j] + gain(j), j))
+        for i in owners[p]:
+            if node not in quorums[i]:
+                quorums[i].add(node)
+                load[node] += 1
+
+    return quorums
+
+
+def _pad_extra_nodes(n, lines):
+    """
+    Forms the quora of at least as many nodes as points: each point's node
+    gets the line through it, and each extra node the line whose points are
+    least loaded, by the sum of their squared loads, plus itself. Supersets
+    of lines still meet, so the extra nodes then join the smallest quora
+    until they arbitrate for as many as the points' nodes on average.
+
+    Returns:
+        list: Quorum of each node, as a set of ids.
+    """
+    size = len(lines)
+    quorums = [set(line) for line in lines]
+
+    lines_through = [[] for i in range(size)]
+    for l, points in enumerate(lines):
+        for p in points:
+            lines_through[p].append(l)
+
+    # Sum of the squared loads of the points of each line, kept up to date
+    load = [len(lines[0])] * size + [0] * (n - size)
+    squares = [sum(load[p] * load[p] for p in line) for line in lines]
+    for x in range(size, n):
+        line = min(range(size), key=squares.__getitem__)
+        quorums.append(set(lines[line]) | {x})
+        for p in lines[line]:
+            for l in lines_through[p]:
+                squares[l] += 2 * load[p] + 1
+            load[p] += 1
+        load[x] += 1
+
+    target = round(sum(load[:size]) / size)
+    smallest = [(len(members), i) for i, members in enumerate(quorums)]
+    heapq.heapify(smallest)
+    for x in range(size, n):
+        joined, skipped = [], []
+        while smallest and load[x] + len(joined) < target:
+            entry = heapq.heappop(smallest)
+            (skipped if x in quorums[entry[1]] else joined).append(entry)
+        for _, i in joined:
+            quorums[i].add(x)
+            heapq.heappush(smallest, (len(quorums[i]), i))
+        for entry in skipped:
+            heapq.heappush(smallest, entry)
+        load[x] += len(joined)
+
+    return quorums
+
+
+def verify_members(quorums):
+    """
+    Checks that every quorum only has known nodes and that every node
+    belongs to its own quorum, in time linear in the size of the quora.
+
+    Args:
+        quorums (list): Quorum of each node.
+
+    Raises:
+        ValueError: If some condition does not hold.
+    """
+    for i, members in enumerate(quorums):
+        if any(not 0 <= j < len(quorums) for j in members):
+            raise ValueError(f"[ValueError]: Quorum of Node_{i} has unknown nodes")
+        if i not in members:
+            raise ValueError(f"[ValueError]: Node_{i} is not in its own quorum")
+
+
+def verify_quorums(quorums):
+    """
+    Checks the members of every quorum, as verify_members does, and that
+    every two quora intersect.
+
+    Args:
+        quorums (list): Quorum of each node.
+
+    Raises:
+        ValueError: If some condition does not hold.
+    """
+    verify_members(quorums)
+    masks = [sum(1 << j for j in set(members)) for members in quorums]
+
+    for i in range(len(masks)):
+        for j in range(i + 1, len(masks)):
+            if not masks[i] & masks[j]:
+                raise ValueError(f"[ValueError]: Quora of Node_{i} and Node_{j} do not intersect")
+
+
+# Format of the cached quorum maps
+CACHE_VERSION = 1
+
+STRATEGIES = {
+    "grid": grid_quorums,
+    "projective": projective_quorums,
+}
+
+
+@lru_cache(maxsize=None)
+def build_quorums(n, strategy=None):
+    """
+    Forms and verifies the quora of all the nodes.
+
+    Args:
+        n (int): Number of nodes.
+        strategy (str, optional): Name of the construction. Defaults to
+            config.quorum.
+
+    Raises:
+        ValueError: If there is no construction with that name.
+
+    Returns:
+        tuple: Quorum of each node, as a tuple of ids that includes the node.
+    """
+    if strategy is None:
+        strategy = config.quorum
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"[ValueError]: Unknown quorum strategy: {strategy}")
+
+    quorums = STRATEGIES[strategy](n)
+    verify_quorums(quorums)
+    return tuple(tuple(members) for members in quorums)
+
+
+class QuorumMap(object):
+    """
+    Quora of all the nodes of a system, together with their inverse. It is
+    computed once and shared, read-only, by all the nodes.
+
+    Attributes:
+        quorums (tuple): Quorum of each node, as a tuple of ids.
+        arbitrated (tuple): For each node, ids of the nodes whose quorum
+            contains it, i.e. whose requests it arbitrates.
+    """
+    def __init__(self, quorums):
+        """
+        Constructor for class QuorumMap.
+
+        Args:
+            quorums (list): Quorum of each node, already verified.
+        """
+        self.quorums = tuple(tuple(members) for members in quorums)
+
+        arbitrated = [[] for i in range(len(self.quorums))]
+        for i, members in enumerate(self.quorums):
+            for j in members:
+                arbitrated[j].append(i)
+        self.arbitrated = tuple(tuple(nodes) for nodes in arbitrated)
+
+    def __len__(self):
+        return len(self.quorums)
+
+    def quorum(self, node_id):
+        """
+        Args:
+            node_id (int): Id of the node.
+
+        Returns:
+            tuple: Ids of the members of the node's quorum.
+        """
+        return self.quorums[node_id]
+
+    def arbiter_of(self, node_id):
+        """
+        Args:
+            node_id (int): Id of the node.
+
+        Returns:
+            tuple: Ids of the nodes whose requests the node arbitrates.
+        """
+        return self.arbitrated[node_id]
+
+
+def get_quorum_map(n, strategy=None, cache_dir=None):
+    """
+    Returns the quorum map of a system, loading it from the cache directory
+    if it was already computed for the same number of nodes and strategy,
+    with the same format, and is intact, and storing it there otherwise.
+
+    Args:
+        n (int): Number of nodes.
+        strategy (str, optional): Name of the construction. Defaults to
+            config.quorum.
+        cache_dir (str, optional): Directory for the cached maps. Defaults
+            to config.quorum_cache; None disables the cache.
+
+    Returns:
+        QuorumMap: The quorum map.
+    """
+    if strategy is None:
+        strategy = config.quorum
+    if cache_dir is None:
+        cache_dir = config.quorum_cache
+
+    if cache_dir is None:
+        return QuorumMap(build_quorums(n, strategy))
+
+    path = os.path.join(cache_dir, f"{strategy}_{n}.json")
+    if os.path.exists(path):
+        # A stale, truncated or edited map is rebuilt rather than trusted.
+        # Maps were verified when built, so a matching digest and sane
+        # members suffice, without the quadratic intersection check
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+            if cached["version"] != CACHE_VERSION or cached["n"] != n or cached["strategy"] != strategy:
+                raise ValueError(f"[ValueError]: Cached quorum map {path} is stale")
+            if cached["digest"] != _digest(cached["quorums"]):
+                raise ValueError(f"[ValueError]: Cached quorum map {path} is corrupt")
+            verify_members(cached["quorums"])
+            return QuorumMap(cached["quorums"])
+        except (ValueError, TypeError, KeyError) as e:
+            print("Exception: ", end="")
+            print(e)
+
+    quorums = build_quorums(n, strategy)
+
+    # Written aside and renamed, so that processes reading it at the same
+    # time never see a partial file
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "version": CACHE_VERSION,
+                "n": n,
+                "strategy": strategy,
+                "digest": _digest(quorums),
+                "quorums": quorums,
+            }, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return QuorumMap(quorums)
+
+
+def _digest(quorums):
+    """
+    Returns:
+        str: SHA-256 of the quora, in the JSON they are cached as.
+    """
+    return hashlib.sha256(json.dumps([list(members) for members in quorums]).encode("utf-8")).hexdigest()
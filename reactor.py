@@ -0,0 +1,121 @@
+import selectors
+import socket
+from collections import deque
+from threading import Event, Lock, Thread
+import config
+
+
+class Reactor(Thread):
+    """
+    Event loop that services the server sockets and connections of many
+    nodes from a single thread, using the best selector available on the
+    platform (epoll on Linux), so its cost per wakeup does not depend on the
+    number of connections and it is not limited by FD_SETSIZE.
+
+    Attributes:
+        daemon (bool): Thread's daemon option.
+        selector (selectors.BaseSelector): Selector for all the sockets.
+    """
+    def __init__(self):
+        """
+        Constructor for class Reactor.
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self.selector = selectors.DefaultSelector()
+
+        # Servers to stop servicing, handed over to the reactor's thread
+        self.__stopping = deque()
+        self.__waker, self.__wakeup = socket.socketpair()
+        self.selector.register(self.__waker, selectors.EVENT_READ, None)
+
+    def register(self, server):
+        """
+        Starts servicing a node's server socket and the connections it
+        accepts. The server must be already listening.
+
+        Args:
+            server (NodeServer): Server of the node.
+        """
+        self.selector.register(server.server_socket, selectors.EVENT_READ, (server, None))
+
+    def unregister(self, server):
+        """
+        Stops servicing a node's server socket and the connections it
+        accepted, and closes them all. It waits for the reactor's thread to
+        do so, so the node's address can be taken again on return.
+
+        Args:
+            server (NodeServer): Server of the node.
+        """
+        done = Event()
+        self.__stopping.append((server, done))
+        self.__wakeup.send(b"\0")
+        done.wait()
+
+    def __stop_servers(self):
+        """
+        Unregisters and closes the sockets of the servers to stop.
+        """
+        self.__waker.recv(4096)
+        while self.__stopping:
+            server, done = self.__stopping.popleft()
+            for key in list(self.selector.get_map().values()):
+                if key.data is None or key.data[0] is not server:
+                    continue
+                self.selector.unregister(key.fileobj)
+                if key.data[1] is None:
+                    server.server_socket.close()
+                else:
+                    server.close(key.data[1])
+            done.set()
+
+    def run(self):
+        """
+        Worker for the objects of this class launched as Threads. Accepts new
+        connections, dispatches the readable ones to their server and closes
+        the sockets of the servers unregistered.
+        """
+        while True:
+            stopping = False
+            for key, _ in self.selector.select():
+                if key.data is None:
+                    # Once the rest of the sockets ready have been served
+                    stopping = True
+                    continue
+                server, conn = key.data
+
+                if conn is None:
+                    conn = server.accept()
+                    self.selector.register(conn, selectors.EVENT_READ, (server, conn))
+                elif not server.receive(conn):
+                    self.selector.unregister(conn)
+                    server.close(conn)
+
+            if stopping:
+                self.__stop_servers()
+
+
+_reactors = []
+_reactors_lock = Lock()
+
+
+def get_reactor(node_id):
+    """
+    Returns the reactor in charge of a node, starting the process' reactors
+    the first time. Nodes are spread over config.reactor_threads reactors.
+
+    Args:
+        node_id (int): Id of the node.
+
+    Returns:
+        Reactor: Reactor for the node.
+    """
+    with _reactors_lock:
+        if not _reactors:
+            for i in range(config.reactor_threads):
+                reactor = Reactor()
+                reactor.start()
+                _reactors.append(reactor)
+
+    return _reactors[node_id % len(_reactors)]
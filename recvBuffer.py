@@ -0,0 +1,95 @@
+class RecvBuffer(object):
+    """
+    Reassembly buffer for the byte stream of a single connection. Bytes are
+    received directly into a preallocated buffer and complete messages are
+    decoded from a view of it, so a message split across several reads is
+    kept until the rest of it arrives.
+
+    Attributes:
+        codec (JsonCodec | BinaryCodec): Wire format of the stream.
+        buffer (bytearray): Preallocated storage for the received bytes.
+        view (memoryview): View of the buffer used to receive and decode.
+        start (int): Position of the first byte not yet decoded.
+        end (int): Position after the last byte received.
+    """
+    def __init__(self, codec, size=4096):
+        """
+        Constructor for class RecvBuffer.
+
+        Args:
+            codec (JsonCodec | BinaryCodec): Wire format of the stream.
+            size (int, optional): Initial size of the buffer. Defaults to 4096.
+        """
+        self.codec = codec
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def recv_from(self, sock):
+        """
+        Receives as many bytes as available from a socket, after the ones
+        still pending to be decoded.
+
+        Args:
+            sock (socket.socket): Socket to receive from.
+
+        Returns:
+            int: Number of bytes received, 0 if the connection was closed.
+        """
+        if self.end == len(self.buffer):
+            self.__make_room()
+
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def feed(self, data):
+        """
+        Appends bytes that have already been received by other means, such
+        as an asyncio stream.
+
+        Args:
+            data (bytes-like): Bytes received.
+        """
+        while len(self.buffer) - self.end < len(data):
+            self.__make_room()
+
+        self.view[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def messages(self):
+        """
+        Decodes all the complete messages received so far, keeping any
+        partial message at the tail for the next read.
+
+        Raises:
+            ValueError: If the stream is malformed.
+
+        Returns:
+            list: Decoded Messages, in order of arrival.
+        """
+        msgs, consumed = self.codec.decode(self.view[self.start:self.end])
+        self.start += consumed
+
+        # Rewind when everything has been decoded, which is the usual case
+        if self.start == self.end:
+            self.start = self.end = 0
+
+        return msgs
+
+    def __make_room(self):
+        """
+        Makes room at the end of the buffer, either by moving the pending
+        bytes to its start or, if they already fill it, by doubling its size.
+        """
+        pending = bytes(self.view[self.start:self.end])
+
+        if self.start == 0:
+            self.view.release()
+            self.buffer = bytearray(2 * len(self.buffer))
+            self.view = memoryview(self.buffer)
+
+        self.view[:len(pending)] = pending
+        self.start = 0
+        self.end = len(pending)
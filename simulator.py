@@ -0,0 +1,460 @@
+"""
+Discrete-event simulation of the mutex. The handlers of MaekawaProtocol run
+unchanged on a virtual clock, in a single thread, with messages delayed by
+configurable latency distributions. Runs are reproducible: the same seed
+gives the same interleaving. Run it from the repository root:
+
+    python simulator.py --nodes 1024 --rounds 10 --seed 1
+"""
+import argparse
+import heapq
+import json
+import random
+from collections import deque
+from copy import copy
+from protocol import MaekawaProtocol, flog, clog
+from workload import Workload, constant, exponential, parse_distribution
+import logger_config
+import metrics
+import quorum
+
+
+class EventScheduler(object):
+    """
+    Virtual clock with a queue of pending events. Events due at the same
+    time run in the order they were scheduled.
+
+    Attributes:
+        now (float): Current virtual time, in seconds.
+        events (list): Heap of pending (time, seq, callback, args) events.
+        processed (int): Number of events run.
+    """
+    def __init__(self):
+        """
+        Constructor for class EventScheduler.
+        """
+        self.now = 0.0
+        self.events = []
+        self.processed = 0
+        self.__seq = 0
+
+    def schedule(self, delay, callback, *args):
+        """
+        Schedules a call after a virtual delay.
+
+        Args:
+            delay (float): Delay from now, in seconds.
+            callback (callable): Function to be called.
+            *args: Arguments of the call.
+        """
+        self.schedule_at(self.now + delay, callback, *args)
+
+    def schedule_at(self, when, callback, *args):
+        """
+        Schedules a call at a virtual time.
+
+        Args:
+            when (float): Time of the call, not before now.
+            callback (callable): Function to be called.
+            *args: Arguments of the call.
+        """
+        self.__seq += 1
+        heapq.heappush(self.events, (when, self.__seq, callback, args))
+
+    def run(self, until=None):
+        """
+        Runs the events in time order until there are none left.
+
+        Args:
+            until (float, optional): Virtual time at which to stop. Defaults
+                to None, to run all the events.
+        """
+        events = self.events
+        while events:
+            if until is not None and events[0][0] > until:
+                self.now = until
+                break
+            self.now, _, callback, args = heapq.heappop(events)
+            callback(*args)
+            self.processed += 1
+
+
+class SimNetwork(object):
+    """
+    Delivers messages between simulated nodes after a random latency. Each
+    link keeps its order, like a TCP connection; messages on different links
+    may overtake each other.
+
+    Attributes:
+        scheduler (EventScheduler): Virtual clock of the simulation.
+        rng (random.Random): Source of randomness of the simulation.
+        latency (callable): Default latency distribution of the links.
+        link_latency (dict): Latency distribution of particular links, by
+            (src, dest).
+        nodes (list): Simulated nodes, by id.
+        trace (list): Delivered messages as (time, type, src, dest), or None
+            if not traced.
+    """
+    def __init__(self, scheduler, rng, latency, link_latency=None, trace=False):
+        """
+        Constructor for class SimNetwork.
+
+        Args:
+            scheduler (EventScheduler): Virtual clock of the simulation.
+            rng (random.Random): Source of randomness of the simulation.
+            latency (callable): Default latency distribution of the links.
+            link_latency (dict, optional): Latency distribution of particular
+                links, by (src, dest). Defaults to None.
+            trace (bool, optional): True to record every delivery. Defaults
+                to False.
+        """
+        self.scheduler = scheduler
+        self.rng = rng
+        self.latency = latency
+        self.link_latency = link_latency or {}
+        self.nodes = []
+        self.trace = [] if trace else None
+        self.__last_delivery = {}
+
+    def send(self, src, dest, msg):
+        """
+        Schedules the delivery of a message.
+
+        Args:
+            src (int): Id of the sending node.
+            dest (int): Id of the receiving node.
+            msg (Message): Message to be delivered.
+        """
+        link = (src, dest)
+        latency = self.link_latency.get(link, self.latency)
+        when = self.scheduler.now + latency(self.rng)
+
+        # Never overtake a message sent earlier on the same link
+        last = self.__last_delivery.get(link)
+        if last is not None and when < last:
+            when = last
+        self.__last_delivery[link] = when
+
+        self.scheduler.schedule_at(when, self.deliver, dest, msg)
+
+    def deliver(self, dest, msg):
+        """
+        Hands a message to its receiving node.
+
+        Args:
+            dest (int): Id of the receiving node.
+            msg (Message): Message to be delivered.
+        """
+        if self.trace is not None:
+            self.trace.append((self.scheduler.now, msg.msg_type.name, msg.src, dest))
+        self.nodes[dest].handle(msg)
+
+
+class SimNodeSend(object):
+    """
+    Handles a simulated node's operations related to message sending.
+
+    Attributes:
+        node (SimNode): Node that sends the messages.
+        network (SimNetwork): Carries the messages.
+    """
+    def __init__(self, node, network):
+        """
+        Constructor for class SimNodeSend.
+
+        Args:
+            node (SimNode): Node that sends the messages.
+            network (SimNetwork): Carries the messages.
+        """
+        self.node = node
+        self.network = network
+
+    def send_message(self, msg, dest, multicast=False):
+        """
+        Sends a message to a single destination.
+
+        Args:
+            msg (Message): Message to be sent.
+            dest (int): Destination Node id.
+            multicast (bool, optional): True for multicast option; False for single destination. Defaults to False.
+        """
+        if not multicast:
+            self.node.lamport_ts += 1
+            msg.set_ts(self.node.lamport_ts)
+        assert dest == msg.dest
+        self.network.send(self.node.id, dest, msg)
+        self.node.metrics.message_sent(msg.msg_type)
+
+    def multicast(self, msg, group):
+        """
+        Sends a message to all Nodes within a group.
+
+        Args:
+            msg (Message): Message to be sent.
+            group (list): IDs of all the nodes in the group.
+        """
+        self.node.lamport_ts += 1
+        msg.set_ts(self.node.lamport_ts)
+        for dest in group:
+            new_msg = copy(msg)
+            new_msg.set_dest(dest)
+            self.network.send(self.node.id, dest, new_msg)
+        self.node.metrics.message_sent(msg.msg_type, len(group))
+
+
+class SimNode(MaekawaProtocol):
+    """
+    Node of a simulated system. It enters the critical section as soon as it
+    gets all the grants and leaves it after the request's hold time.
+    Requests that arrive while the node is busy wait in a local queue.
+
+    Attributes:
+        id (int): Numerical identifier of the Node.
+        sim (Simulator): Simulation the node belongs to.
+        client (SimNodeSend): Client for handling message sending.
+        pending (deque): Requests arrived and not served yet, as (arrival,
+            hold, shared).
+        busy (bool): True from a request until its release; False otherwise.
+    """
+    def __init__(self, id, sim, quorum_map):
+        """
+        Constructor for class SimNode.
+
+        Args:
+            id (int): Numerical identifier of the Node.
+            sim (Simulator): Simulation the node belongs to.
+            quorum_map (QuorumMap): Quora of all the nodes.
+        """
+        self.id = id
+        self.sim = sim
+        self._init_protocol(quorum_map, sim.forwarding, sim.sticky)
+        self.client = SimNodeSend(self, sim.network)
+        self.pending = deque()
+        self.busy = False
+        self.__hold = 0
+
+    def _clock(self):
+        return self.sim.scheduler.now
+
+    def arrive(self, hold, shared=False):
+        """
+        A request arrives: it is issued now if the node is idle, and queued
+        otherwise.
+
+        Args:
+            hold (float): Time to hold the critical section.
+            shared (bool, optional): True to take the section shared.
+                Defaults to False.
+        """
+        self.pending.append((self.sim.scheduler.now, hold, shared))
+        if not self.busy:
+            self.__request()
+
+    def __request(self):
+        arrival, self.__hold, shared = self.pending.popleft()
+        self.busy = True
+        self.request_cs(arrival, shared=shared)
+
+    def _all_granted(self, state):
+        """
+        Enters the critical section and schedules the exit.
+
+        Args:
+            state (LockState): State of the default lock, the only one used.
+        """
+        if not self.busy or state.in_CS:
+            return
+        self._enter_cs(state)
+        self.sim.entered(self, state.shared)
+        self.sim.scheduler.schedule(self.__hold, self.release)
+
+    def release(self):
+        """
+        Leaves the critical section and issues the next queued request.
+        """
+        self.sim.left(self)
+        self.release_cs()
+        self.busy = False
+        self.sim.released(self)
+        if self.pending:
+            self.__request()
+
+
+class Simulator(object):
+    """
+    Simulated system of n nodes. By default each node enters the critical
+    section a number of rounds separated by random think times; given a
+    Workload, nodes serve its requests open-loop instead. Mutual exclusion
+    is checked on every entry: shared holders may overlap with each other,
+    but never with an exclusive one.
+
+    Attributes:
+        scheduler (EventScheduler): Virtual clock of the simulation.
+        rng (random.Random): Source of randomness of the simulation.
+        network (SimNetwork): Carries the messages between the nodes.
+        workload (Workload): Requests of all the nodes, or None for rounds.
+        think (callable): Distribution of the time between a node leaving
+            the critical section and requesting it again, in rounds.
+        hold (callable): Distribution of the time spent in the critical
+            section, in rounds.
+        nodes (list): Simulated nodes.
+        holder (SimNode): Node holding the critical section exclusively, or
+            None.
+        readers (set): Nodes holding the critical section shared.
+        max_readers (int): Most shared holders at the same time.
+        forwarding (bool): True if the nodes forward GRANTs on release.
+        sticky (bool): True if the nodes keep GRANTs until recalled.
+    """
+    def __init__(self, n, strategy=None, seed=0, rounds=3, latency=exponential(0.001),
+                 link_latency=None, think=exponential(0.01), hold=constant(0.001), trace=False,
+                 workload=None, forwarding=False, sticky=False):
+        """
+        Constructor for class Simulator.
+
+        Args:
+            n (int): Number of nodes.
+            strategy (str, optional): Quorum construction. Defaults to
+                config.quorum.
+            seed (int, optional): Seed of the simulation. Defaults to 0.
+            rounds (int, optional): Critical section entries of each node.
+                Defaults to 3.
+            latency (callable, optional): Default latency distribution of the
+                links. Defaults to exponential with a mean of 1 ms.
+            link_latency (dict, optional): Latency distribution of particular
+                links, by (src, dest). Defaults to None.
+            think (callable, optional): Distribution of the think time.
+                Defaults to exponential with a mean of 10 ms.
+            hold (callable, optional): Distribution of the hold time.
+                Defaults to 1 ms.
+            trace (bool, optional): True to record every delivery in
+                network.trace. Defaults to False.
+            workload (Workload, optional): Requests of all the nodes, which
+                replace the rounds. Defaults to None.
+            forwarding (bool, optional): True to forward GRANTs on release.
+                Defaults to False.
+            sticky (bool, optional): True to keep GRANTs after release until
+                recalled. Defaults to False.
+        """
+        self.scheduler = EventScheduler()
+        self.rng = random.Random(seed)
+        self.network = SimNetwork(self.scheduler, self.rng, latency, link_latency, trace)
+        self.workload = workload
+        self.think = think
+        self.hold = hold
+        self.forwarding = forwarding
+        self.sticky = sticky
+
+        quorum_map = quorum.get_quorum_map(n, strategy)
+        self.nodes = [SimNode(i, self, quorum_map) for i in range(n)]
+        self.network.nodes = self.nodes
+        self.holder = None
+        self.readers = set()
+        self.max_readers = 0
+        self.__rounds = [rounds] * n
+
+    def entered(self, node, shared=False):
+        """
+        Checks that no other node is in the critical section, apart from
+        shared holders if the node entered shared.
+
+        Raises:
+            RuntimeError: If mutual exclusion is violated.
+        """
+        if self.holder is not None:
+            raise RuntimeError(f"[RuntimeError]: Node_{node.id} entered the critical section "
+                               f"held by Node_{self.holder.id} at t={self.scheduler.now}")
+        if shared:
+            self.readers.add(node)
+            self.max_readers = max(self.max_readers, len(self.readers))
+        elif self.readers:
+            raise RuntimeError(f"[RuntimeError]: Node_{node.id} entered the critical section "
+                               f"shared by {len(self.readers)} nodes at t={self.scheduler.now}")
+        else:
+            self.holder = node
+
+    def left(self, node):
+        """
+        Clears the node from the holders of the critical section.
+        """
+        if self.holder is node:
+            self.holder = None
+        self.readers.discard(node)
+
+    def released(self, node):
+        """
+        Schedules the next round of a node, if it has any left.
+        """
+        if self.workload is None:
+            self.__rounds[node.id] -= 1
+            if self.__rounds[node.id] > 0:
+                self.__next_round(node)
+
+    def __next_round(self, node):
+        self.scheduler.schedule(self.think(self.rng), node.arrive, self.hold(self.rng))
+
+    def run(self, until=None):
+        """
+        Runs the simulation until all the requests are served.
+
+        Args:
+            until (float, optional): Virtual time at which to stop. Defaults
+                to None.
+
+        Returns:
+            dict: Summary of the run, as metrics.summarize returns, with
+                virtual times.
+        """
+        for node in self.nodes:
+            if self.workload is None:
+                self.__next_round(node)
+            else:
+                for arrival, hold, shared in self.workload.requests(node.id):
+                    self.scheduler.schedule_at(arrival, node.arrive, hold, shared)
+        self.scheduler.run(until)
+
+        summary = metrics.summarize([node.metrics.snapshot() for node in self.nodes], self.scheduler.now)
+        summary["events"] = self.scheduler.processed
+        summary["max_readers"] = self.max_readers
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discrete-event simulation of Maekawa's mutex.")
+    parser.add_argument("--nodes", type=int, default=16, help="number of nodes")
+    parser.add_argument("--rounds", type=int, default=3, help="critical section entries per node")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulation")
+    parser.add_argument("--quorum", default=None, help="quorum strategy (default: config.quorum)")
+    parser.add_argument("--latency", default="exponential:0.001", help="latency distribution of the links")
+    parser.add_argument("--think", default="exponential:0.01", help="distribution of the think time")
+    parser.add_argument("--hold", default="constant:0.001", help="distribution of the hold time")
+    parser.add_argument("--workload", default="rounds", choices=("rounds", "poisson", "onoff", "trace"),
+                        help="arrival process; rounds uses --rounds and --think")
+    parser.add_argument("--rate", type=float, default=100.0, help="requests per second of the whole system")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of requests to generate")
+    parser.add_argument("--hotspots", type=int, default=0, help="nodes that request more often")
+    parser.add_argument("--hotspot-weight", type=float, default=10.0, help="how many times more often")
+    parser.add_argument("--trace-file", default=None, help="requests to replay with the trace workload")
+    parser.add_argument("--read-ratio", type=float, default=0.0, help="share of the requests that are shared")
+    parser.add_argument("--forwarding", action="store_true", help="forward GRANTs on release")
+    parser.add_argument("--sticky", action="store_true", help="keep GRANTs after release until recalled")
+    args = parser.parse_args()
+
+    # Logging every message would dominate the run time
+    flog.setLevel(logger_config.logging.WARNING)
+    clog.setLevel(logger_config.logging.WARNING)
+
+    workload = None
+    if args.workload != "rounds":
+        workload = Workload(args.nodes, args.workload, args.rate, args.duration,
+                            parse_distribution(args.hold), args.hotspots, args.hotspot_weight,
+                            trace_file=args.trace_file, seed=args.seed, read_ratio=args.read_ratio)
+
+    sim = Simulator(args.nodes, args.quorum, args.seed, args.rounds,
+                    parse_distribution(args.latency), think=parse_distribution(args.think),
+                    hold=parse_distribution(args.hold), workload=workload, forwarding=args.forwarding,
+                    sticky=args.sticky)
+    print(json.dumps(sim.run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
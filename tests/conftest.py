@@ -0,0 +1,14 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# The modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The loggers write to logs/ under the working directory, opened on import
+scratch = tempfile.mkdtemp(prefix="maekawa_tests_")
+atexit.register(shutil.rmtree, scratch, True)
+os.chdir(scratch)
+os.mkdir("logs")
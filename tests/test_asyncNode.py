@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+import config
+import quorum
+import utils
+from asyncNode import AsyncNode, start_nodes
+from message import Message, Message_type
+
+
+@pytest.mark.parametrize("transport, port", [("tcp", 21400), ("unix", 21410)])
+def test_cancelled_acquire_is_given_up(monkeypatch, transport, port):
+    monkeypatch.setattr(config, "numNodes", 4)
+    monkeypatch.setattr(config, "port", port)
+    monkeypatch.setattr(config, "transport", transport)
+
+    async def run():
+        nodes = await start_nodes(range(config.numNodes))
+        holder, waiter, peer = nodes[0], nodes[1], nodes[2]
+        try:
+            await holder.acquire()
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(waiter.acquire(), 0.2)
+            await holder.release()
+
+            # Neither the node that timed out nor its peers are stuck
+            await asyncio.wait_for(waiter.acquire(), 5)
+            await waiter.release()
+            await asyncio.wait_for(peer.acquire(), 5)
+            await peer.release()
+        finally:
+            for node in nodes:
+                await node.close()
+
+    asyncio.run(run())
+
+
+def test_unsupported_transport(monkeypatch):
+    monkeypatch.setattr(config, "transport", "inmemory")
+    with pytest.raises(ValueError):
+        AsyncNode(0, quorum.get_quorum_map(4))
+
+
+def test_malformed_stream_and_unreachable_node(monkeypatch):
+    monkeypatch.setattr(config, "numNodes", 4)
+    monkeypatch.setattr(config, "port", 21420)
+    monkeypatch.setattr(config, "transport", "tcp")
+
+    async def run():
+        nodes = await start_nodes(range(config.numNodes))
+        try:
+            # The node closes a connection that sends garbage
+            reader, writer = await asyncio.open_connection(*utils.node_address(0))
+            writer.write(b'{"msg_type": 3}')
+            assert await asyncio.wait_for(reader.read(), 5) == b""
+            writer.close()
+
+            # Messages to a node that cannot be reached are dropped
+            nodes[0].client.send_message(Message(Message_type.REQUEST, 0, 9, data=0), 9)
+            assert 9 in nodes[0].client.pending
+            for _ in range(100):
+                if 9 not in nodes[0].client.pending:
+                    break
+                await asyncio.sleep(0.01)
+            assert 9 not in nodes[0].client.pending
+
+            # The node keeps working
+            await asyncio.wait_for(nodes[0].acquire(), 5)
+            await nodes[0].release()
+        finally:
+            for node in nodes:
+                await node.close()
+
+    asyncio.run(run())
+
+
+def test_idle_lock_states_are_dropped(monkeypatch):
+    monkeypatch.setattr(config, "numNodes", 4)
+    monkeypatch.setattr(config, "port", 21430)
+    monkeypatch.setattr(config, "transport", "tcp")
+
+    async def run():
+        nodes = await start_nodes(range(config.numNodes))
+        try:
+            for i in range(20):
+                node = nodes[i % len(nodes)]
+                await node.acquire(f"key{i}")
+                await node.release(f"key{i}")
+            await asyncio.wait_for(nodes[0].acquire("held"), 5)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(nodes[1].acquire("held"), 0.2)
+            await nodes[0].release("held")
+
+            # Once the last RELEASEs are handled no node keeps any state
+            for _ in range(500):
+                if not any(node.locks or node._locals for node in nodes):
+                    break
+                await asyncio.sleep(0.01)
+            assert not any(node.locks or node._locals for node in nodes)
+        finally:
+            for node in nodes:
+                await node.close()
+
+    asyncio.run(run())
@@ -0,0 +1,33 @@
+import pytest
+import codec
+from message import Message, Message_type
+from recvBuffer import RecvBuffer
+
+
+@pytest.mark.parametrize("name", ["json", "binary"])
+def test_keys_with_frame_delimiters(name):
+    wire = codec.CODECS[name]()
+    msgs = [Message(Message_type.REQUEST, 1, 2, 5, 7, "a}{b"),
+            Message(Message_type.GRANT, 2, 1, 6, 7, '}{"x": 1}{'),
+            Message(Message_type.RELEASE, 1, 2, 8, None, None)]
+
+    head, tail = wire.encode_template(msgs[1])
+    stream = wire.encode(msgs[0]) + head + wire.encode_dest(1) + tail + wire.encode(msgs[2])
+
+    # Split the stream at every byte, as partial reads would
+    for cut in range(len(stream) + 1):
+        buffer = RecvBuffer(wire)
+        buffer.feed(stream[:cut])
+        decoded = buffer.messages()
+        buffer.feed(stream[cut:])
+        decoded += buffer.messages()
+        assert [(m.msg_type, m.src, m.dest, m.ts, m.data, m.key) for m in decoded] == \
+            [(m.msg_type, m.src, m.dest, m.ts, m.data, m.key) for m in msgs]
+
+
+@pytest.mark.parametrize("frame", [b"x", b'{"msg_type": 3}', b"[1, 2]", b'{"msg_type": 99, "src": 1, '
+                                   b'"dest": 2, "ts": 5, "data": null}'])
+def test_malformed_json_is_rejected(frame):
+    wire = codec.JsonCodec()
+    with pytest.raises(ValueError):
+        wire.decode(wire.encode(Message(Message_type.REQUEST, 1, 2, 5, 7)) + frame)
@@ -0,0 +1,102 @@
+import threading
+import time
+import pytest
+import config
+from maekawaMutex import MaekawaMutex
+
+
+@pytest.mark.parametrize("transport, reactor_threads, port", [
+    ("tcp", 0, 21500), ("tcp", 2, 21520), ("unix", 0, 21540), ("unix", 2, 21560), ("inmemory", 0, 21580),
+    ("shm", 0, 21590)])
+def test_close_releases_the_addresses(monkeypatch, transport, reactor_threads, port):
+    monkeypatch.setattr(config, "numNodes", 4)
+    monkeypatch.setattr(config, "port", port)
+    monkeypatch.setattr(config, "transport", transport)
+    monkeypatch.setattr(config, "reactor_threads", reactor_threads)
+    monkeypatch.setattr(config, "send_queue_size", 64)
+    monkeypatch.setattr(config, "workload", "rounds")
+    monkeypatch.setattr(config, "rounds", 2)
+    monkeypatch.setattr(config, "time_scale", 0.01)
+
+    threads = None
+    for _ in range(3):
+        mutex = MaekawaMutex()
+        mutex.run()
+        snapshots = mutex.snapshot()
+        mutex.close()
+
+        assert sum(s["cs_entries"] for s in snapshots) == config.numNodes * config.rounds
+
+        # Nothing of a run is left behind for the next one
+        if threads is None:
+            threads = threading.active_count()
+        assert threading.active_count() == threads
+
+
+@pytest.mark.parametrize("transport, port", [("tcp", 21600), ("inmemory", 21620), ("shm", 21640)])
+def test_cancelled_acquire_is_given_up(monkeypatch, transport, port):
+    monkeypatch.setattr(config, "numNodes", 4)
+    monkeypatch.setattr(config, "port", port)
+    monkeypatch.setattr(config, "transport", transport)
+
+    mutex = MaekawaMutex()
+    holder, waiter, peer = mutex.lock(0), mutex.lock(1), mutex.lock(2)
+    try:
+        assert holder.acquire(timeout=5)
+        assert not waiter.acquire(timeout=0.2)
+        assert not waiter.try_acquire(timeout=5)
+        assert not waiter.locked()
+        holder.release()
+
+        # Neither the node that gave up nor its peers are stuck
+        assert waiter.acquire(timeout=5)
+        waiter.release()
+        assert peer.acquire(timeout=5)
+        peer.release()
+        assert holder.acquire(timeout=5)
+        holder.release()
+    finally:
+        mutex.close()
+
+
+def test_idle_lock_states_are_dropped(monkeypatch):
+    monkeypatch.setattr(config, "numNodes", 4)
+    monkeypatch.setattr(config, "transport", "inmemory")
+
+    mutex = MaekawaMutex()
+    try:
+        for i in range(20):
+            lock = mutex.lock(i % config.numNodes, f"key{i}")
+            assert lock.acquire(timeout=5)
+            lock.release()
+        holder = mutex.lock(0, "held")
+        assert holder.acquire(timeout=5)
+        assert not mutex.lock(1, "held").acquire(timeout=0.2)
+        holder.release()
+
+        # Once the last RELEASEs are handled no node keeps any state
+        deadline = time.monotonic() + 5
+        while any(node.locks for node in mutex.nodes) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not any(node.locks for node in mutex.nodes)
+    finally:
+        mutex.close()
+
+
+@pytest.mark.parametrize("transport, port", [("unix", 21660), ("shm", 21680)])
+def test_running_system_is_not_taken_over(monkeypatch, transport, port):
+    monkeypatch.setattr(config, "numNodes", 4)
+    monkeypatch.setattr(config, "port", port)
+    monkeypatch.setattr(config, "transport", transport)
+
+    mutex = MaekawaMutex()
+    try:
+        with pytest.raises(OSError):
+            MaekawaMutex()
+
+        # The running system still works
+        lock = mutex.lock(0)
+        assert lock.acquire(timeout=5)
+        lock.release()
+    finally:
+        mutex.close()
@@ -0,0 +1,31 @@
+import pytest
+import metrics
+from message import Message_type
+from simulator import Simulator
+from workload import Workload, constant
+
+
+def test_entries_are_not_capped_by_the_samples():
+    node = metrics.NodeMetrics(0)
+    entries = metrics.MAX_INTERVALS + 2000
+    for i in range(entries):
+        node.message_sent(Message_type.REQUEST)
+        node.record_cs(i, i + 0.5, i + 1)
+
+    result = metrics.summarize([node.snapshot()], 10.0)
+    assert result["entries"] == entries
+    assert result["messages_per_entry"] == 1
+
+
+def test_grant_wait_excludes_the_local_queue(tmp_path):
+    # Five requests arrive at once at a node; four wait for the first ones
+    trace = tmp_path / "trace.txt"
+    trace.write_text("".join("0,0,0.01\n" for _ in range(5)))
+    workload = Workload(4, "trace", trace_file=str(trace))
+    sim = Simulator(4, "grid", latency=constant(0.001), workload=workload)
+    result = sim.run()
+
+    grant_wait = sim.nodes[0].metrics.grant_wait
+    assert result["entries"] == grant_wait.count == 5
+    assert grant_wait.sum / grant_wait.count == pytest.approx(0.002)
+    assert result["acquire_p99"] > 0.04
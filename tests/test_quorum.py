@@ -0,0 +1,43 @@
+import json
+from math import sqrt
+import pytest
+from quorum import QuorumMap, build_quorums, get_quorum_map, projective_plane, projective_quorums, verify_quorums
+
+
+@pytest.mark.parametrize("n", range(4, 200))
+def test_projective_quorums_are_balanced(n):
+    quorums = projective_quorums(n)
+    verify_quorums(quorums)
+
+    # Each node arbitrates for about as many quora as any other
+    load = [len(nodes) for nodes in QuorumMap(quorums).arbitrated]
+    assert max(load) <= 2 * min(load)
+    assert max(len(members) for members in quorums) <= 2 * sqrt(n)
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    path = tmp_path / "grid_9.json"
+    expected = build_quorums(9, "grid")
+    assert get_quorum_map(9, "grid", str(tmp_path)).quorums == expected
+    assert get_quorum_map(9, "grid", str(tmp_path)).quorums == expected
+
+    # Edited without updating the digest
+    cached = json.loads(path.read_text())
+    cached["quorums"] = [[i] for i in range(9)]
+    path.write_text(json.dumps(cached))
+    assert get_quorum_map(9, "grid", str(tmp_path)).quorums == expected
+
+    # Truncated, or from an older format
+    for text in ("[[0, 1, 2", json.dumps([list(members) for members in expected])):
+        path.write_text(text)
+        assert get_quorum_map(9, "grid", str(tmp_path)).quorums == expected
+        assert json.loads(path.read_text())["quorums"] == [list(members) for members in expected]
+    assert [p.name for p in tmp_path.iterdir()] == ["grid_9.json"]
+
+
+@pytest.mark.parametrize("q", [2, 3, 4, 5, 7, 8, 9, 16])
+def test_cyclic_planes(q):
+    lines = [set(line) for line in projective_plane(q)]
+    assert len(lines) == q * q + q + 1
+    assert all(i in line and len(line) == q + 1 for i, line in enumerate(lines))
+    assert all(len(a & b) == 1 for i, a in enumerate(lines) for b in lines[i + 1:])
@@ -0,0 +1,80 @@
+import random
+import pytest
+from message import Message_type
+from simulator import Simulator
+from workload import Workload, constant, exponential
+
+
+def requests(workload):
+    return sum(len(workload.requests(i)) for i in range(workload.n))
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_readers_share_and_writers_are_served(seed):
+    workload = Workload(16, "poisson", rate=400, duration=0.5, hold=constant(0.005), seed=seed, read_ratio=0.5)
+    writes = sum(not shared for i in range(16) for _, _, shared in workload.requests(i))
+    sim = Simulator(16, "grid", seed=seed, workload=workload)
+    result = sim.run()
+
+    # The simulator raises if a writer overlaps with anyone
+    assert result["max_readers"] > 1
+    assert writes > 0
+    assert result["entries"] == requests(workload)
+    assert all(not node.busy and not node.pending for node in sim.nodes)
+
+
+def sent(sim, msg_type):
+    return sum(node.metrics.sent[msg_type] for node in sim.nodes)
+
+
+def uneven_links(n, seed):
+    # Fast and slow links, so that messages overtake each other across them
+    rng = random.Random(seed)
+    return {(src, dest): exponential(rng.choice((0.0002, 0.01)))
+            for src in range(n) for dest in range(n) if src != dest}
+
+
+@pytest.mark.parametrize("strategy, n", [("grid", 25), ("projective", 21)])
+@pytest.mark.parametrize("uneven", [False, True])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_forwarding_serves_every_request(strategy, n, uneven, seed):
+    links = uneven_links(n, seed) if uneven else None
+    sim = Simulator(n, strategy, seed=seed, rounds=8, link_latency=links, think=exponential(0.002),
+                    forwarding=True)
+    result = sim.run()
+
+    assert result["entries"] == n * 8
+    assert all(not node.busy for node in sim.nodes)
+
+    # GRANTs were handed over, and some preempted on their way
+    assert sent(sim, Message_type.NEXT) > 0
+    assert sent(sim, Message_type.FORWARD) > 0
+    assert sent(sim, Message_type.INQUIRE) > 0
+
+
+@pytest.mark.parametrize("forwarding", [False, True])
+@pytest.mark.parametrize("uneven", [False, True])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_sticky_grants_serve_every_request(forwarding, uneven, seed):
+    links = uneven_links(16, seed) if uneven else None
+    sim = Simulator(16, "grid", seed=seed, rounds=8, link_latency=links, think=exponential(0.002),
+                    forwarding=forwarding, sticky=True)
+    result = sim.run()
+
+    assert result["entries"] == 16 * 8
+    assert all(not node.busy for node in sim.nodes)
+
+    # Kept GRANTs were recalled
+    assert sent(sim, Message_type.INQUIRE) > 0
+
+
+@pytest.mark.parametrize("forwarding", [False, True])
+def test_sticky_grants_save_messages_on_a_hot_spot(forwarding):
+    def run(sticky):
+        workload = Workload(16, "poisson", rate=200, duration=1, hold=constant(0.001), hotspots=1,
+                            hotspot_weight=100, seed=1)
+        result = Simulator(16, "grid", seed=1, workload=workload, forwarding=forwarding, sticky=sticky).run()
+        assert result["entries"] == requests(workload)
+        return result["messages_per_entry"]
+
+    assert run(True) < run(False) / 2
@@ -0,0 +1,36 @@
+import os
+import socket
+import pytest
+import config
+import utils
+
+
+def test_unix_server_socket_is_not_taken_over(tmp_path):
+    path = str(tmp_path / "node.sock")
+    server = utils.create_unix_server_socket(path)
+    try:
+        with pytest.raises(OSError):
+            utils.create_unix_server_socket(path)
+    finally:
+        server.close()
+
+    # Nobody listens now: the file left behind is replaced
+    assert os.path.exists(path)
+    utils.create_unix_server_socket(path).close()
+
+
+def test_unix_server_socket_keeps_other_files(tmp_path):
+    path = tmp_path / "node.sock"
+    path.write_text("not a socket")
+    with pytest.raises(OSError):
+        utils.create_unix_server_socket(str(path))
+    assert path.read_text() == "not a socket"
+
+
+def test_socket_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "socket_dir", str(tmp_path / "sockets"))
+    assert utils.socket_dir() == str(tmp_path / "sockets")
+    assert os.path.isdir(utils.socket_dir())
+
+    monkeypatch.setattr(config, "socket_dir", None)
+    assert os.stat(utils.socket_dir()).st_uid == os.getuid()
@@ -0,0 +1,751 @@
+from multiprocessing import resource_tracker, shared_memory
+import os
+import secrets
+import select
+import socket
+import sys
+from threading import Thread
+import time
+from recvBuffer import RecvBuffer
+import utils
+import codec
+import config
+import reactor
+
+class SocketChannel(object):
+    """
+    Outgoing link to a node over a connected stream socket.
+
+    Attributes:
+        blocking (bool): Sending may block while the peer is slow.
+        sock (socket.socket): Connected socket.
+        codec (JsonCodec | BinaryCodec): Wire format for the messages.
+    """
+    blocking = True
+
+    def __init__(self, sock, codec):
+        """
+        Constructor for class SocketChannel.
+
+        Args:
+            sock (socket.socket): Connected socket.
+            codec (JsonCodec | BinaryCodec): Wire format for the messages.
+        """
+        self.sock = sock
+        self.codec = codec
+
+    def send(self, msg):
+        """
+        Sends a message through the link.
+
+        Args:
+            msg (Message): Message to be sent.
+        """
+        self.sock.sendall(self.codec.encode(msg))
+
+    def send_parts(self, parts):
+        """
+        Sends an already encoded message, split in several buffers, with a
+        single vectored write.
+
+        Args:
+            parts (tuple): Buffers that form the encoded message.
+        """
+        sent = self.sock.sendmsg(parts)
+        if sent < sum(len(part) for part in parts):
+            self.sock.sendall(b"".join(parts)[sent:])
+
+    def close(self):
+        """
+        Closes the link.
+        """
+        self.sock.close()
+
+
+class TcpTransport(object):
+    """
+    Transport over TCP connections. Each node listens at its address in
+    config.addresses or, by default, on localhost at config.port plus its
+    id.
+
+    Attributes:
+        name (str): Name under which the transport is selected in config.
+        codec (JsonCodec | BinaryCodec): Wire format for the messages.
+        servers (list): Servers of the nodes that listened.
+    """
+    name = "tcp"
+
+    def __init__(self):
+        """
+        Constructor for class TcpTransport.
+        """
+        self.codec = codec.get_codec()
+        self.servers = []
+
+    def server_socket(self, node_id):
+        """
+        Creates the listening socket of a node.
+
+        Args:
+            node_id (int): Id of the node.
+
+        Returns:
+            socket.socket: Socket on the server side.
+        """
+        host, port = utils.node_address(node_id)
+        return utils.create_server_socket(port, host)
+
+    def listen(self, server):
+        """
+        Starts receiving the messages of a node, either from its own server
+        thread or from a shared reactor.
+
+        Args:
+            server (NodeServer): Server of the node.
+        """
+        server.listen()
+        if config.reactor_threads:
+            reactor.get_reactor(server.node.id).register(server)
+        else:
+            server.start()
+        self.servers.append(server)
+
+    def connect(self, node_id, dest):
+        """
+        Opens a link from a node to another one.
+
+        Args:
+            node_id (int): Id of the sending node.
+            dest (int): Id of the receiving node.
+
+        Returns:
+            SocketChannel: Link to the receiving node.
+        """
+        sock = utils.create_client_socket()
+        sock.connect(utils.node_address(dest))
+        return SocketChannel(sock, self.codec)
+
+    def close(self):
+        """
+        Stops servicing the servers of the nodes that listened, closing
+        their sockets and the connections they accepted.
+        """
+        for server in self.servers:
+            if config.reactor_threads:
+                reactor.get_reactor(server.node.id).unregister(server)
+            else:
+                server.stop()
+        self.servers = []
+
+
+class UnixTransport(TcpTransport):
+    """
+    Transport over Unix domain stream sockets, for nodes on the same host.
+    Each node listens at a path of config.socket_dir derived from
+    config.port and its id, so no ports are taken. Framing and dispatch are
+    the same as over TCP, shared reactors included.
+
+    Attributes:
+        name (str): Name under which the transport is selected in config.
+        codec (JsonCodec | BinaryCodec): Wire format for the messages.
+        servers (list): Servers of the nodes that listened.
+    """
+    name = "unix"
+
+    def __init__(self):
+        """
+        Constructor for class UnixTransport.
+        """
+        TcpTransport.__init__(self)
+        self.__paths = []
+
+    @staticmethod
+    def socket_path(node_id):
+        """
+        Returns the path a node listens at.
+
+        Args:
+            node_id (int): Id of the node.
+
+        Returns:
+            str: Path of the socket.
+        """
+        return os.path.join(utils.socket_dir(), f"maekawa_{config.port}_{node_id}.sock")
+
+    def server_socket(self, node_id):
+        """
+        Creates the listening socket of a node.
+
+        Args:
+            node_id (int): Id of the node.
+
+        Returns:
+            socket.socket: Socket on the server side.
+        """
+        path = UnixTransport.socket_path(node_id)
+        self.__paths.append(path)
+        return utils.create_unix_server_socket(path)
+
+    def connect(self, node_id, dest):
+        """
+        Opens a link from a node to another one.
+
+        Args:
+            node_id (int): Id of the sending node.
+            dest (int): Id of the receiving node.
+
+        Returns:
+            SocketChannel: Link to the receiving node.
+        """
+        sock = utils.create_client_socket(socket.AF_UNIX)
+        sock.connect(UnixTransport.socket_path(dest))
+        return SocketChannel(sock, self.codec)
+
+    def close(self):
+        """
+        Stops servicing the servers of the nodes that listened, and removes
+        their socket files.
+        """
+        TcpTransport.close(self)
+        for path in self.__paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                None
+
+
+class MailboxChannel(object):
+    """
+    Outgoing link to a node within the same process. Messages are handed
+    over as objects, without being serialized.
+
+    Attributes:
+        blocking (bool): Sending never blocks.
+        transport (InMemoryTransport): Transport that delivers the messages.
+        dest (int): Id of the receiving node.
+    """
+    blocking = False
+
+    def __init__(self, transport, dest):
+        """
+        Constructor for class MailboxChannel.
+
+        Args:
+            transport (InMemoryTransport): Transport that delivers the messages.
+            dest (int): Id of the receiving node.
+        """
+        self.transport = transport
+        self.dest = dest
+
+    def send(self, msg):
+        """
+        Sends a message through the link.
+
+        Args:
+            msg (Message): Message to be sent.
+        """
+        self.transport.deliver(self.dest, msg)
+
+    def close(self):
+        """
+        Closes the link.
+        """
+        None
+
+
+class InMemoryTransport(object):
+    """
+    Transport between nodes of the same process, with no sockets at all.
+    Messages are handed to the server of the receiving node, which posts
+    them to the node's actor. Since a node only sends from its own actor,
+    each link keeps its order, like a TCP connection would.
+
+    Attributes:
+        name (str): Name under which the transport is selected in config.
+        codec (None): Messages are not serialized.
+        servers (dict): Server of each listening node, by id.
+    """
+    name = "inmemory"
+    codec = None
+
+    def __init__(self):
+        """
+        Constructor for class InMemoryTransport.
+        """
+        self.servers = {}
+
+    def listen(self, server):
+        """
+        Starts receiving the messages of a node.
+
+        Args:
+            server (NodeServer): Server of the node.
+        """
+        self.servers[server.node.id] = server
+
+    def connect(self, node_id, dest):
+        """
+        Opens a link from a node to another one.
+
+        Args:
+            node_id (int): Id of the sending node.
+            dest (int): Id of the receiving node.
+
+        Returns:
+            MailboxChannel: Link to the receiving node.
+        """
+        return MailboxChannel(self, dest)
+
+    def deliver(self, dest, msg):
+        """
+        Hands a message to the receiving node's server.
+
+        Args:
+            dest (int): Id of the receiving node.
+            msg (Message): Message to be delivered.
+        """
+        self.servers[dest].process_message(msg)
+
+    def close(self):
+        """
+        Releases the resources shared by the nodes using the transport.
+        """
+        None
+
+
+class RingBuffer(object):
+    """
+    Single-producer/single-consumer ring of bytes in a shared memory
+    segment, carrying the stream of one link. The header holds the
+    counters of the bytes ever read and written. The producer only moves
+    the tail and the consumer only moves the head, each with a single
+    aligned store, so no lock is needed.
+
+    Attributes:
+        shm (SharedMemory): Segment of the ring.
+        capacity (int): Bytes the ring holds.
+        counters (memoryview): Head and tail of the ring.
+        data (memoryview): Storage of the ring.
+    """
+    HEADER = 16
+
+    def __init__(self, shm):
+        """
+        Constructor for class RingBuffer.
+
+        Args:
+            shm (SharedMemory): Segment of the ring.
+        """
+        self.shm = shm
+        self.capacity = shm.size - RingBuffer.HEADER
+        self.counters = shm.buf[:RingBuffer.HEADER].cast("Q")
+        self.data = shm.buf[RingBuffer.HEADER:RingBuffer.HEADER + self.capacity]
+
+    @staticmethod
+    def name(src, dest):
+        """
+        Returns a new name for the segment of a link. Names are random, so
+        links never collide with those of other systems or runs; the
+        receiving node learns it when the link is announced.
+
+        Args:
+            src (int): Id of the sending node.
+            dest (int): Id of the receiving node.
+
+        Returns:
+            str: Name of the segment.
+        """
+        return f"maekawa_{config.port}_{src}_{dest}_{secrets.token_hex(8)}"
+
+    def write(self, data):
+        """
+        Appends bytes to the ring, waiting while there is no room for them.
+
+        Args:
+            data (bytes-like): Bytes to be written.
+
+        Raises:
+            ValueError: If the bytes do not fit in the ring.
+        """
+        size = len(data)
+        if size > self.capacity:
+            raise ValueError(f"[ValueError]: Message of {size} bytes does not fit in the ring")
+
+        counters = self.counters
+        tail = counters[1]
+        while self.capacity - (tail - counters[0]) < size:
+            time.sleep(0.0001)
+
+        pos = tail % self.capacity
+        if pos + size <= self.capacity:
+            self.data[pos:pos + size] = data
+        else:
+            first = self.capacity - pos
+            self.data[pos:] = data[:first]
+            self.data[:size - first] = data[first:]
+
+        # Publish the bytes
+        counters[1] = tail + size
+
+    def read_into(self, buffer):
+        """
+        Moves all the bytes written so far to a reassembly buffer.
+
+        Args:
+            buffer (RecvBuffer): Buffer of the link.
+
+        Returns:
+            bool: True if some bytes were read; False otherwise.
+        """
+        counters = self.counters
+        head = counters[0]
+        tail = counters[1]
+        if head == tail:
+            return False
+
+        while head != tail:
+            pos = head % self.capacity
+            end = pos + tail - head
+            if end <= self.capacity:
+                buffer.feed(self.data[pos:end])
+            else:
+                buffer.feed(self.data[pos:])
+                buffer.feed(self.data[:end - self.capacity])
+            counters[0] = head = tail
+            tail = counters[1]
+        return True
+
+    def close(self):
+        """
+        Unmaps the segment.
+        """
+        self.counters.release()
+        self.data.release()
+        self.shm.close()
+
+
+class ShmChannel(object):
+    """
+    Outgoing link to a node of the same host over a shared memory ring.
+    Every write is followed by a signal on the receiving node's eventfd.
+    The kernel orders the signal after the write, and the receiver clears
+    the eventfd before it reads the rings, so no write goes unnoticed.
+
+    Attributes:
+        blocking (bool): Sending may block while the ring is full.
+        ring (RingBuffer): Ring of the link.
+        codec (JsonCodec | BinaryCodec): Wire format for the messages.
+        efd (int): Descriptor of the receiving node's eventfd.
+    """
+    blocking = True
+
+    def __init__(self, ring, codec, efd):
+        """
+        Constructor for class ShmChannel.
+
+        Args:
+            ring (RingBuffer): Ring of the link.
+            codec (JsonCodec | BinaryCodec): Wire format for the messages.
+            efd (int): Descriptor of the receiving node's eventfd, owned
+                by the link from now on.
+        """
+        self.ring = ring
+        self.codec = codec
+        self.efd = efd
+
+    def send(self, msg):
+        """
+        Sends a message through the link.
+
+        Args:
+            msg (Message): Message to be sent.
+        """
+        self.ring.write(self.codec.encode(msg))
+        os.eventfd_write(self.efd, 1)
+
+    def send_parts(self, parts):
+        """
+        Sends an already encoded message, split in several buffers.
+
+        Args:
+            parts (tuple): Buffers that form the encoded message.
+        """
+        self.ring.write(b"".join(parts))
+        os.eventfd_write(self.efd, 1)
+
+    def close(self):
+        """
+        Closes the link.
+        """
+        os.close(self.efd)
+        self.ring.close()
+
+
+class ShmReceiver(Thread):
+    """
+    Thread that receives the messages of a node over shared memory.
+    Senders announce their links at the node's Unix domain socket, which
+    attaches their rings and hands them the node's eventfd, and signal the
+    eventfd after every write. The thread sleeps on the eventfd and the
+    socket, and on waking up clears the eventfd before draining all the
+    rings.
+
+    Attributes:
+        server (NodeServer): Server of the node.
+        daemon (bool): Thread's daemon option.
+        path (str): Path of the node's socket.
+        sock (socket.socket): Socket where the links are announced.
+        efd (int): Descriptor of the node's eventfd.
+        rings (list): Ring and reassembly buffer of each link.
+    """
+    def __init__(self, server, path):
+        """
+        Constructor for class ShmReceiver.
+
+        Args:
+            server (NodeServer): Server of the node.
+            path (str): Path of the node's socket.
+
+        Raises:
+            OSError: If another node is listening at the path.
+        """
+        Thread.__init__(self)
+        self.server = server
+        self.daemon = True
+        self.path = path
+        self.sock = utils.create_unix_server_socket(path)
+        self.efd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        self.rings = []
+        self.__running = True
+
+    def run(self):
+        """
+        Worker for the objects of this class launched as Threads.
+        """
+        while self.__running:
+            readable, _, _ = select.select([self.sock, self.efd], [], [])
+            if self.sock in readable:
+                self.__attach()
+
+            # Writes signalled from now on wake the thread up again
+            try:
+                os.eventfd_read(self.efd)
+            except BlockingIOError:
+                None
+            self.__drain()
+
+        for ring, _ in self.rings:
+            ring.close()
+        self.sock.close()
+        os.unlink(self.path)
+
+    def __attach(self):
+        """
+        Accepts the announcement of a link, attaches its ring and replies
+        with the node's eventfd.
+        """
+        conn, _ = self.sock.accept()
+        try:
+            conn.settimeout(1)
+            name = b""
+            while True:
+                data = conn.recv(256)
+                if not data:
+                    break
+                name += data
+
+            shm = shared_memory.SharedMemory(name.decode())
+            shm.unlink()
+            self.rings.append((RingBuffer(shm), RecvBuffer(self.server.codec)))
+            socket.send_fds(conn, [b"\0"], [self.efd])
+        except (OSError, ValueError) as e:
+            print("Exception: ", end="")
+            print(e)
+        finally:
+            conn.close()
+
+    def __drain(self):
+        """
+        Processes the messages completed in all the rings.
+        """
+        for ring, buffer in self.rings:
+            if not ring.read_into(buffer):
+                continue
+            try:
+                msgs = buffer.messages()
+            except ValueError as e:
+                print("Exception: ", end="")
+                print(e)
+                continue
+
+            for m in msgs:
+                try:
+                    self.server.process_message(m)
+                except Exception as e:
+                    print("Exception: ", end="")
+                    print(e)
+
+    def stop(self):
+        """
+        Stops the thread, waking it up through its eventfd, and waits for
+        it to finish.
+        """
+        self.__running = False
+        os.eventfd_write(self.efd, 1)
+        self.join()
+        os.close(self.efd)
+
+
+class ShmTransport(object):
+    """
+    Transport between processes of the same host over shared memory. Each
+    link is a RingBuffer created by its sender, and announced at the
+    receiving node's Unix domain socket in config.socket_dir, which replies
+    with the node's eventfd to be signalled after every write. Messages are
+    serialized with the same framing as over TCP.
+
+    Attributes:
+        name (str): Name under which the transport is selected in config.
+        codec (JsonCodec | BinaryCodec): Wire format for the messages.
+        receivers (dict): Receiver of each listening node, by id.
+    """
+    name = "shm"
+
+    def __init__(self):
+        """
+        Constructor for class ShmTransport.
+
+        Raises:
+            ValueError: If the platform has no eventfd.
+        """
+        if not hasattr(os, "eventfd"):
+            raise ValueError("[ValueError]: Transport shm needs eventfd, on Linux with Python 3.10 or later")
+        self.codec = codec.get_codec()
+        self.receivers = {}
+
+    @staticmethod
+    def socket_path(node_id):
+        """
+        Returns the path where a node's links are announced.
+
+        Args:
+            node_id (int): Id of the node.
+
+        Returns:
+            str: Path of the socket.
+        """
+        return os.path.join(utils.socket_dir(), f"maekawa_{config.port}_{node_id}.shm")
+
+    @staticmethod
+    def create_segment(name, size):
+        """
+        Creates the shared memory segment of a link. The receiving node
+        unlinks it once attached, maybe from another process, so the
+        resource tracker of this one must not unlink it at exit.
+
+        Args:
+            name (str): Name of the segment.
+            size (int): Bytes of the segment.
+
+        Raises:
+            FileExistsError: If there is a segment with that name.
+
+        Returns:
+            SharedMemory: The segment.
+        """
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(name, create=True, size=size, track=False)
+
+        # The tracker knows POSIX segments by their name with a leading slash
+        shm = shared_memory.SharedMemory(name, create=True, size=size)
+        resource_tracker.unregister("/" + shm.name, "shared_memory")
+        return shm
+
+    def listen(self, server):
+        """
+        Starts receiving the messages of a node from its own receiver
+        thread. Shared reactors are not used.
+
+        Args:
+            server (NodeServer): Server of the node.
+
+        Raises:
+            OSError: If another node is listening at the node's path.
+        """
+        receiver = ShmReceiver(server, ShmTransport.socket_path(server.node.id))
+        receiver.start()
+        self.receivers[server.node.id] = receiver
+
+    def connect(self, node_id, dest):
+        """
+        Opens a link from a node to another one, which must be listening.
+
+        Args:
+            node_id (int): Id of the sending node.
+            dest (int): Id of the receiving node.
+
+        Raises:
+            ConnectionError: If the receiving node did not attach the ring.
+
+        Returns:
+            ShmChannel: Link to the receiving node.
+        """
+        shm = ShmTransport.create_segment(RingBuffer.name(node_id, dest), RingBuffer.HEADER + config.shm_ring_size)
+        ring = RingBuffer(shm)
+
+        # Announce the link, and get the eventfd to signal
+        sock = utils.create_client_socket(socket.AF_UNIX)
+        fds = []
+        try:
+            sock.connect(ShmTransport.socket_path(dest))
+            sock.sendall(shm.name.encode())
+            sock.shutdown(socket.SHUT_WR)
+            _, fds, _, _ = socket.recv_fds(sock, 1, 1)
+        finally:
+            sock.close()
+            if not fds:
+                # Not attached; nobody else would remove the segment
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    None
+                ring.close()
+
+        if not fds:
+            raise ConnectionError(f"[ConnectionError]: Node_{dest} did not attach the link from Node_{node_id}")
+        return ShmChannel(ring, self.codec, fds[0])
+
+    def close(self):
+        """
+        Stops the receivers, which remove their sockets. The links are
+        closed by the nodes that opened them.
+        """
+        for receiver in self.receivers.values():
+            receiver.stop()
+        self.receivers = {}
+
+
+TRANSPORTS = {transport.name: transport for transport in (TcpTransport, UnixTransport, InMemoryTransport, ShmTransport)}
+
+
+def get_transport(name=None):
+    """
+    Returns a new instance of the selected transport. All the nodes that
+    communicate must share the same instance.
+
+    Args:
+        name (str, optional): Name of the transport. Defaults to config.transport.
+
+    Raises:
+        ValueError: If there is no transport with that name.
+
+    Returns:
+        TcpTransport | UnixTransport | InMemoryTransport | ShmTransport: The
+            transport.
+    """
+    if name is None:
+        name = config.transport
+
+    if name not in TRANSPORTS:
+        raise ValueError(f"[ValueError]: Unknown transport: {name}")
+    return TRANSPORTS[name]()
@@ -1,28 +1,108 @@
+import errno
+import os
 import socket
+import stat
+import tempfile
+import config
 
-def create_server_socket(port):
+def create_server_socket(port, host="127.0.0.1"):
     """
     Creates a socket for a server.
 
     Args:
         port (int): Port which the server listens to.
+        host (str, optional): Address which the server listens at. Defaults
+            to "127.0.0.1".
 
     Returns:
         socket.socket: socket on the server side.
     """
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    s.bind(("127.0.0.1", port))
+    s.bind((host, port))
     s.listen()
     return s
 
-def create_client_socket():
+def create_unix_server_socket(path):
+    """
+    Creates a Unix domain socket for a server. A socket file left at its
+    path is replaced, unless some server still accepts connections there.
+
+    Args:
+        path (str): Path which the server listens at.
+
+    Raises:
+        OSError: If a server is listening at the path, or there is a file
+            other than a socket.
+
+    Returns:
+        socket.socket: socket on the server side.
+    """
+    if os.path.exists(path):
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise FileExistsError(errno.EEXIST, "Not a socket", path)
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            # Nobody listens: left behind by a server that did not finish
+            os.unlink(path)
+        except FileNotFoundError:
+            None
+        else:
+            raise OSError(errno.EADDRINUSE, os.strerror(errno.EADDRINUSE), path)
+        finally:
+            probe.close()
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(path)
+    s.listen()
+    return s
+
+def socket_dir():
+    """
+    Returns the directory of the nodes' Unix domain sockets:
+    config.socket_dir or, by default, a directory of the temporary one
+    only accessible to the current user. It is created if needed.
+
+    Returns:
+        str: Path of the directory.
+    """
+    path = config.socket_dir
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f"maekawa-{os.getuid()}")
+    os.makedirs(path, 0o700, exist_ok=True)
+    return path
+
+def create_client_socket(family=socket.AF_INET):
     """
     Creates a socket for a client.
 
+    Args:
+        family (int, optional): Address family of the socket. Defaults to
+            socket.AF_INET.
+
     Returns:
         socket.socket: socket on the client side.
     """
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s = socket.socket(family, socket.SOCK_STREAM)
     s.settimeout(1000) #non-blocking mode
     return s
+
+def node_address(node_id):
+    """
+    Returns the address a node listens at: its entry in config.addresses
+    or, by default, localhost at config.port plus its id.
+
+    Args:
+        node_id (int): Id of the node.
+
+    Returns:
+        tuple: Host and port of the node.
+    """
+    if config.addresses is None:
+        return ("127.0.0.1", config.port + node_id)
+
+    host, port = config.addresses[node_id].rsplit(":", 1)
+    return (host, int(port))
@@ -0,0 +1,274 @@
+"""
+Open-loop workloads for the mutex. A workload fixes in advance, for every
+node, when each request for the critical section arrives and how long the
+section is held. Arrivals do not wait for previous requests to be served:
+a node that is busy queues them, so queueing delay shows up in the acquire
+latency. The same workload can drive any runtime, transport or quorum
+strategy.
+"""
+import math
+import random
+import config
+
+
+def constant(delay):
+    """
+    Returns:
+        callable: Distribution that always draws delay.
+    """
+    return lambda rng: delay
+
+
+def uniform(low, high):
+    """
+    Returns:
+        callable: Uniform distribution between low and high.
+    """
+    return lambda rng: rng.uniform(low, high)
+
+
+def exponential(mean):
+    """
+    Returns:
+        callable: Exponential distribution with the given mean.
+    """
+    return lambda rng: rng.expovariate(1 / mean)
+
+
+def lognormal(median, sigma):
+    """
+    Returns:
+        callable: Log-normal distribution with the given median and shape.
+    """
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+DISTRIBUTIONS = {
+    "constant": constant,
+    "uniform": uniform,
+    "exponential": exponential,
+    "lognormal": lognormal,
+}
+
+
+def parse_distribution(spec):
+    """
+    Builds a distribution from a specification like "exponential:0.001" or
+    "uniform:0.001,0.002".
+
+    Args:
+        spec (str): Name of the distribution and its parameters.
+
+    Raises:
+        ValueError: If there is no distribution with that name.
+
+    Returns:
+        callable: The distribution, which draws a value from a Random.
+    """
+    name, _, params = spec.partition(":")
+    if name not in DISTRIBUTIONS:
+        raise ValueError(f"[ValueError]: Unknown distribution: {name}")
+    return DISTRIBUTIONS[name](*(float(p) for p in params.split(",") if p))
+
+
+def poisson_arrivals(rng, rate, duration):
+    """
+    Arrival times of a Poisson process.
+
+    Args:
+        rng (random.Random): Source of randomness.
+        rate (float): Mean arrivals per second.
+        duration (float): Seconds of arrivals to generate.
+
+    Returns:
+        list: Arrival times, in seconds from the start.
+    """
+    times = []
+    t = rng.expovariate(rate)
+    while t < duration:
+        times.append(t)
+        t += rng.expovariate(rate)
+    return times
+
+
+def onoff_arrivals(rng, rate, duration, on_time, off_time):
+    """
+    Arrival times of a bursty on/off process: Poisson arrivals during on
+    periods, none during off periods, both of exponential length. The rate
+    applies within bursts.
+
+    Args:
+        rng (random.Random): Source of randomness.
+        rate (float): Mean arrivals per second during on periods.
+        duration (float): Seconds of arrivals to generate.
+        on_time (float): Mean length of the on periods, in seconds.
+        off_time (float): Mean length of the off periods, in seconds.
+
+    Returns:
+        list: Arrival times, in seconds from the start.
+    """
+    times = []
+    t = rng.expovariate(1 / off_time)
+    while t < duration:
+        end = min(t + rng.expovariate(1 / on_time), duration)
+        t += rng.expovariate(rate)
+        while t < end:
+            times.append(t)
+            t += rng.expovariate(rate)
+        t = end + rng.expovariate(1 / off_time)
+    return times
+
+
+def read_trace(path):
+    """
+    Reads a trace of requests. Each line holds the arrival time in seconds,
+    the node id and, optionally, the hold time, separated by commas or
+    spaces. Empty lines and lines starting with # are skipped.
+
+    Args:
+        path (str): Path of the trace file.
+
+    Returns:
+        list: Requests as (time, node, hold), hold being None if missing.
+    """
+    requests = []
+    with open(path) as f:
+        for line in f:
+            fields = line.replace(",", " ").split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            hold = float(fields[2]) if len(fields) > 2 else None
+            requests.append((float(fields[0]), int(fields[1]), hold))
+    return requests
+
+
+class Workload(object):
+    """
+    Requests of every node of a system, generated from a seed so that any
+    runtime replays exactly the same demand.
+
+    Attributes:
+        n (int): Number of nodes.
+        arrivals (str): Arrival process: "poisson", "onoff" or "trace".
+        rate (float): Mean arrivals per second of the whole system.
+        duration (float): Seconds of arrivals to generate.
+        hold (callable): Distribution of the time spent in the CS.
+        read_ratio (float): Share of the requests that are shared.
+        weights (list): Share of the arrivals of each node, summing 1.
+        seed (int): Seed of the workload.
+    """
+    def __init__(self, n, arrivals="poisson", rate=10.0, duration=10.0, hold=constant(0),
+                 hotspots=0, hotspot_weight=10.0, on_time=1.0, off_time=4.0, trace_file=None, seed=0,
+                 read_ratio=0.0):
+        """
+        Constructor for class Workload.
+
+        Args:
+            n (int): Number of nodes.
+            arrivals (str, optional): Arrival process: "poisson", "onoff" or
+                "trace". Defaults to "poisson".
+            rate (float, optional): Mean arrivals per second of the whole
+                system. Defaults to 10.
+            duration (float, optional): Seconds of arrivals to generate.
+                Defaults to 10.
+            hold (callable, optional): Distribution of the time spent in the
+                CS. Defaults to 0.
+            hotspots (int, optional): Nodes, picked at random, that request
+                more often than the rest. Defaults to 0.
+            hotspot_weight (float, optional): How many times more often
+                hot-spot nodes request. Defaults to 10.
+            on_time (float, optional): Mean length of the bursts of the
+                on/off process. Defaults to 1.
+            off_time (float, optional): Mean length of the silences of the
+                on/off process. Defaults to 4.
+            trace_file (str, optional): Requests to replay, for the "trace"
+                process. Defaults to None.
+            seed (int, optional): Seed of the workload. Defaults to 0.
+            read_ratio (float, optional): Share of the requests, picked at
+                random, that only read and take the lock shared. Defaults
+                to 0.
+
+        Raises:
+            ValueError: If the arrival process is unknown or the trace
+                refers to nodes that do not exist.
+        """
+        if arrivals not in ("poisson", "onoff", "trace"):
+            raise ValueError(f"[ValueError]: Unknown arrival process: {arrivals}")
+
+        self.n = n
+        self.arrivals = arrivals
+        self.rate = rate
+        self.duration = duration
+        self.hold = hold
+        self.on_time = on_time
+        self.off_time = off_time
+        self.seed = seed
+        self.read_ratio = read_ratio
+
+        weights = [1.0] * n
+        for i in random.Random(seed).sample(range(n), min(hotspots, n)):
+            weights[i] = hotspot_weight
+        total = sum(weights)
+        self.weights = [w / total for w in weights]
+
+        self.__trace = None
+        if arrivals == "trace":
+            self.__trace = [[] for i in range(n)]
+            for t, node, hold_time in sorted(read_trace(trace_file)):
+                if not 0 <= node < n:
+                    raise ValueError(f"[ValueError]: Trace refers to Node_{node} of {n}")
+                self.__trace[node].append((t, hold_time))
+
+    def requests(self, node_id):
+        """
+        Requests of a node, always the same for the same seed.
+
+        Args:
+            node_id (int): Id of the node.
+
+        Returns:
+            list: Requests as (arrival, hold, shared), times in seconds,
+                sorted by arrival.
+        """
+        rng = random.Random(self.seed * 1000003 + node_id)
+
+        if self.__trace is not None:
+            return [(t, self.hold(rng) if hold is None else hold, self.__shared(rng))
+                    for t, hold in self.__trace[node_id]]
+
+        rate = self.rate * self.weights[node_id]
+        if rate <= 0:
+            return []
+        if self.arrivals == "poisson":
+            times = poisson_arrivals(rng, rate, self.duration)
+        else:
+            # Keep the long-run rate by concentrating it in the bursts
+            burst_rate = rate * (self.on_time + self.off_time) / self.on_time
+            times = onoff_arrivals(rng, burst_rate, self.duration, self.on_time, self.off_time)
+        return [(t, self.hold(rng), self.__shared(rng)) for t in times]
+
+    def __shared(self, rng):
+        # Draw only for mixed workloads, so exclusive ones keep their values
+        return self.read_ratio > 0 and rng.random() < self.read_ratio
+
+
+def get_workload(n=None):
+    """
+    Builds the workload selected in config.
+
+    Args:
+        n (int, optional): Number of nodes. Defaults to config.numNodes.
+
+    Returns:
+        Workload: The workload, or None for the legacy "rounds" workload of
+            Node.run.
+    """
+    if n is None:
+        n = config.numNodes
+    if config.workload == "rounds":
+        return None
+
+    return Workload(n, config.workload, config.arrival_rate, config.duration,
+                    parse_distribution(config.hold_time), config.hotspots,
+                    config.hotspot_weight, config.on_time, config.off_time,
+                    config.trace_file, config.seed or 0, config.read_ratio)